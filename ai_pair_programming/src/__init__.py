@@ -6,6 +6,10 @@ AI Pair Programming
 
 from .core import (
     EmbeddingManager,
+    EmbeddingCache,
+    EmbeddingBackend,
+    TorchEmbeddingBackend,
+    ONNXEmbeddingBackend,
     Memory,
     MemorySystem,
     KnowledgeItem,
@@ -20,6 +24,10 @@ __version__ = "0.1.0"
 
 __all__ = [
     'EmbeddingManager',
+    'EmbeddingCache',
+    'EmbeddingBackend',
+    'TorchEmbeddingBackend',
+    'ONNXEmbeddingBackend',
     'Memory',
     'MemorySystem',
     'KnowledgeItem',
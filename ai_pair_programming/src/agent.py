@@ -7,6 +7,7 @@ AI配对编程助手
 from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 import time
+import numpy as np
 
 from .core import (
     EmbeddingManager,
@@ -25,7 +26,9 @@ class AIPairProgrammingAgent:
         memory_threshold: float = 0.7,
         max_memories: int = 1000,
         device: Optional[str] = None,
-        cache_dir: Optional[str] = None
+        cache_dir: Optional[str] = None,
+        embedding_cache_path: Optional[str] = None,
+        embedding_backend: str = "torch"
     ):
         """
         初始化AI配对编程助手
@@ -36,11 +39,15 @@ class AIPairProgrammingAgent:
             max_memories: 最大记忆数量
             device: 运行设备
             cache_dir: 模型缓存目录
+            embedding_cache_path: 嵌入向量缓存数据库路径
+            embedding_backend: 嵌入模型推理后端 ('torch' 或 'onnx')
         """
         self.embedding_manager = EmbeddingManager(
             model_name=model_name,
             device=device,
-            cache_dir=cache_dir
+            cache_dir=cache_dir,
+            cache_path=embedding_cache_path,
+            backend=embedding_backend
         )
         self.memory_system = MemorySystem(
             embedding_manager=self.embedding_manager,
@@ -80,7 +87,8 @@ class AIPairProgrammingAgent:
         self,
         content: str,
         memory_type: str,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding: Optional[np.ndarray] = None
     ) -> Memory:
         """
         添加记忆
@@ -89,11 +97,12 @@ class AIPairProgrammingAgent:
             content: 记忆内容
             memory_type: 记忆类型
             metadata: 元数据
+            embedding: 预先计算的嵌入向量
             
         Returns:
             Memory: 新创建的记忆
         """
-        return self.memory_system.add_memory(content, memory_type, metadata)
+        return self.memory_system.add_memory(content, memory_type, metadata, embedding)
     
     def generate_response(
         self,
@@ -117,24 +126,26 @@ class AIPairProgrammingAgent:
             "timestamp": time.time()
         })
         
-        # 添加到记忆系统
-        self.add_memory(user_input, "conversation", context)
+        # 用户输入只编码一次，供检索和记忆写入共用
+        query_embedding = self.embedding_manager.get_embedding(user_input)
         
         # 获取相关记忆和知识
         relevant_memories = self.memory_system.retrieve_relevant_memories(
             user_input,
             k=3,
-            time_window=3600  # 1小时内的记忆
+            time_window=3600,  # 1小时内的记忆
+            query_embedding=query_embedding
         )
         
         relevant_knowledge = self.knowledge_base.query(
             user_input,
             k=3,
-            threshold=0.5
+            threshold=0.5,
+            query_embedding=query_embedding
         )
         
-        # 构建增强上下文
-        enhanced_context = context or {}
+        # 构建增强上下文（复制一份，避免修改作为记忆元数据保存的调用方字典）
+        enhanced_context = dict(context) if context else {}
         if relevant_memories:
             enhanced_context["relevant_memories"] = [
                 {
@@ -168,8 +179,13 @@ class AIPairProgrammingAgent:
             "timestamp": time.time()
         })
         
-        # 添加到记忆系统
-        self.add_memory(response, "conversation", {"type": "response"})
+        # 用户输入和响应一起写入记忆系统，用户输入复用已有的嵌入向量
+        self.memory_system.add_memories_batch(
+            [user_input, response],
+            ["conversation", "conversation"],
+            metadatas=[context, {"type": "response"}],
+            embeddings=[query_embedding, None]
+        )
         
         return response
     
@@ -338,7 +354,9 @@ def create_agent(
     max_memories: int = 1000,
     device: Optional[str] = None,
     cache_dir: Optional[str] = None,
-    load_state_from: Optional[str] = None
+    load_state_from: Optional[str] = None,
+    embedding_cache_path: Optional[str] = None,
+    embedding_backend: str = "torch"
 ) -> AIPairProgrammingAgent:
     """
     创建AI配对编程助手实例
@@ -351,6 +369,8 @@ def create_agent(
         device: 运行设备
         cache_dir: 模型缓存目录
         load_state_from: 状态加载目录
+        embedding_cache_path: 嵌入向量缓存数据库路径
+        embedding_backend: 嵌入模型推理后端 ('torch' 或 'onnx')
         
     Returns:
         AIPairProgrammingAgent: 助手实例
@@ -360,7 +380,9 @@ def create_agent(
         memory_threshold=memory_threshold,
         max_memories=max_memories,
         device=device,
-        cache_dir=cache_dir
+        cache_dir=cache_dir,
+        embedding_cache_path=embedding_cache_path,
+        embedding_backend=embedding_backend
     )
     
     if workspace_path:
@@ -4,7 +4,13 @@ AI Pair Programming Core
 核心功能模块。
 """
 
-from .embedding import EmbeddingManager
+from .embedding import (
+    EmbeddingManager,
+    EmbeddingCache,
+    EmbeddingBackend,
+    TorchEmbeddingBackend,
+    ONNXEmbeddingBackend
+)
 from .memory import Memory, MemorySystem
 from .knowledge import (
     KnowledgeItem,
@@ -16,6 +22,10 @@ from .knowledge import (
 
 __all__ = [
     'EmbeddingManager',
+    'EmbeddingCache',
+    'EmbeddingBackend',
+    'TorchEmbeddingBackend',
+    'ONNXEmbeddingBackend',
     'Memory',
     'MemorySystem',
     'KnowledgeItem',
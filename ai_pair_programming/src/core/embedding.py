@@ -7,9 +7,163 @@
 import torch
 from transformers import AutoTokenizer, AutoModel
 import numpy as np
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Protocol
 from pathlib import Path
 import json
+import sqlite3
+import hashlib
+import contextlib
+import threading
+from collections import OrderedDict
+
+class EmbeddingCache:
+    """基于SQLite的嵌入向量磁盘缓存"""
+    
+    def __init__(self, path: str):
+        """
+        初始化嵌入向量缓存
+        
+        Args:
+            path: SQLite数据库文件路径
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)"
+        )
+        self._conn.commit()
+    
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """
+        读取缓存的嵌入向量
+        
+        Args:
+            key: 缓存键
+            
+        Returns:
+            Optional[np.ndarray]: 命中时返回嵌入向量，否则返回None
+        """
+        row = self._conn.execute(
+            "SELECT vec FROM embeddings WHERE hash = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+    
+    def set_many(self, items: List[tuple]):
+        """
+        批量写入嵌入向量
+        
+        Args:
+            items: (缓存键, 嵌入向量) 列表
+        """
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (hash, vec) VALUES (?, ?)",
+            [(key, np.asarray(vec, dtype=np.float32).tobytes()) for key, vec in items]
+        )
+        self._conn.commit()
+    
+    def close(self):
+        """关闭数据库连接"""
+        self._conn.close()
+
+class EmbeddingBackend(Protocol):
+    """嵌入模型推理后端接口"""
+    def forward(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor: ...
+
+class TorchEmbeddingBackend:
+    """PyTorch推理后端"""
+    
+    def __init__(self, model: torch.nn.Module, device: torch.device, compile_model: bool = False):
+        """
+        初始化PyTorch推理后端
+        
+        Args:
+            model: 已加载的模型
+            device: 运行设备
+            compile_model: 是否使用 torch.compile 编译模型（输入长度变化时会触发重新编译）
+        """
+        self.device = device
+        model.to(device)
+        model.eval()
+        model.requires_grad_(False)
+        if device.type == "cuda":
+            model.half()
+        
+        if compile_model:
+            model = torch.compile(model, mode="reduce-overhead")
+        self.model = model
+    
+    def forward(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """执行前向计算，返回最后一层输出"""
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        
+        # CUDA上使用fp16自动混合精度
+        if self.device.type == "cuda":
+            precision = torch.autocast(device_type="cuda", dtype=torch.float16)
+        else:
+            precision = contextlib.nullcontext()
+        
+        with torch.inference_mode(), precision:
+            outputs = self.model(
+                **inputs,
+                return_dict=True,
+                output_hidden_states=False,
+                output_attentions=False
+            )
+        return outputs.last_hidden_state
+
+class ONNXEmbeddingBackend:
+    """ONNX Runtime推理后端（CPU），可选int8动态量化"""
+    
+    def __init__(
+        self,
+        model_name: str,
+        export_dir: str,
+        cache_dir: Optional[str] = None,
+        quantize: bool = True
+    ):
+        """
+        初始化ONNX Runtime推理后端，首次使用时导出并量化模型
+        
+        Args:
+            model_name: 模型名称或路径
+            export_dir: ONNX模型导出目录
+            cache_dir: 模型缓存目录
+            quantize: 是否使用int8动态量化
+        """
+        # optimum为可选依赖，仅在使用ONNX后端时导入
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        
+        export_path = Path(export_dir)
+        if not (export_path / "model.onnx").exists():
+            model = ORTModelForFeatureExtraction.from_pretrained(
+                model_name, export=True, cache_dir=cache_dir
+            )
+            model.save_pretrained(export_path)
+        
+        file_name = "model.onnx"
+        if quantize:
+            file_name = "model_quantized.onnx"
+            if not (export_path / file_name).exists():
+                quantizer = ORTQuantizer.from_pretrained(export_path)
+                quantizer.quantize(
+                    save_dir=export_path,
+                    quantization_config=AutoQuantizationConfig.avx512_vnni(
+                        is_static=False, per_channel=False
+                    )
+                )
+        
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            export_path,
+            file_name=file_name,
+            provider="CPUExecutionProvider"
+        )
+    
+    def forward(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """执行前向计算，返回最后一层输出"""
+        return self.model(**inputs).last_hidden_state
 
 class EmbeddingManager:
     """嵌入向量管理器"""
@@ -18,7 +172,12 @@ class EmbeddingManager:
         self,
         model_name: str = "shibing624/text2vec-base-chinese",
         device: Optional[str] = None,
-        cache_dir: Optional[str] = None
+        cache_dir: Optional[str] = None,
+        cache_path: Optional[str] = None,
+        lru_size: int = 4096,
+        compile_model: bool = False,
+        backend: str = "torch",
+        quantize: bool = True
     ):
         """
         初始化嵌入向量管理器
@@ -27,9 +186,21 @@ class EmbeddingManager:
             model_name: 模型名称或路径
             device: 运行设备 ('cuda', 'cpu' 或具体的 'cuda:0' 等)
             cache_dir: 模型缓存目录
+            cache_path: 嵌入向量缓存数据库路径，None表示不启用缓存
+            lru_size: 进程内LRU缓存的最大条目数，0表示不启用
+            compile_model: 是否使用 torch.compile 编译模型（仅torch后端）
+            backend: 推理后端 ('torch' 或 'onnx'，onnx仅支持CPU)
+            quantize: onnx后端是否使用int8动态量化
         """
         self.model_name = model_name
         self.cache_dir = cache_dir
+        self.cache_path = cache_path
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        
+        # 进程内LRU缓存，避免同一文本在一次对话中被重复编码
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[Any, np.ndarray]" = OrderedDict()
+        self._lru_lock = threading.Lock()
         
         # 设置设备
         if device is None:
@@ -37,10 +208,24 @@ class EmbeddingManager:
         else:
             self.device = torch.device(device)
         
-        # 加载模型和分词器
+        # 加载分词器和推理后端
         self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
-        self.model = AutoModel.from_pretrained(model_name, cache_dir=cache_dir)
-        self.model.to(self.device)
+        self.backend_name = backend
+        self.quantize = quantize
+        self.compile_model = compile_model
+        
+        if backend == "onnx":
+            if self.device.type != "cpu":
+                raise ValueError("ONNX backend only supports CPU")
+            export_dir = Path(cache_dir or ".") / "onnx" / model_name.replace("/", "__")
+            self.backend: EmbeddingBackend = ONNXEmbeddingBackend(
+                model_name, str(export_dir), cache_dir=cache_dir, quantize=quantize
+            )
+        elif backend == "torch":
+            model = AutoModel.from_pretrained(model_name, cache_dir=cache_dir)
+            self.backend = TorchEmbeddingBackend(model, self.device, compile_model)
+        else:
+            raise ValueError(f"Unsupported embedding backend: {backend}")
         
         # 模型配置
         self.max_length = 512
@@ -54,71 +239,194 @@ class EmbeddingManager:
             text: 输入文本
             
         Returns:
-            numpy.ndarray: 嵌入向量
+            numpy.ndarray: 只读的嵌入向量
+        """
+        if self.lru_size <= 0:
+            return self._load_embedding(text)
+        
+        key = self._lru_key(text)
+        embedding = self._lru_get(key)
+        if embedding is not None:
+            return embedding
+        
+        embedding = self._load_embedding(text)
+        self._lru_put(key, embedding)
+        return embedding
+    
+    def _lru_key(self, text: str) -> Any:
+        """内存LRU缓存键，长文本使用摘要以限制缓存的内存占用"""
+        if len(text) >= 1024:
+            text = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        return (self.pooling_strategy, self.max_length, text)
+    
+    def _lru_get(self, key: Any) -> Optional[np.ndarray]:
+        """读取内存LRU缓存"""
+        with self._lru_lock:
+            embedding = self._lru.get(key)
+            if embedding is not None:
+                self._lru.move_to_end(key)
+            return embedding
+    
+    def _lru_put(self, key: Any, embedding: np.ndarray):
+        """写入内存LRU缓存，超出容量时淘汰最久未使用的条目"""
+        embedding.flags.writeable = False
+        with self._lru_lock:
+            self._lru[key] = embedding
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+    
+    def _load_embedding(self, text: str) -> np.ndarray:
+        """从磁盘缓存读取嵌入向量，未命中时运行模型计算"""
+        if self.cache is None:
+            return self._compute_embedding(text)
+        
+        key = self._cache_key(text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = self._compute_embedding(text)
+            self.cache.set_many([(key, embedding)])
+        return embedding
+    
+    def _compute_embedding(self, text: str) -> np.ndarray:
+        """运行模型计算单条文本的嵌入向量"""
+        return self._encode([text])[0]
+    
+    def batch_get_embeddings(
+        self,
+        texts: list[str],
+        batch_size: int = 32,
+        use_lru: bool = False
+    ) -> np.ndarray:
+        """
+        批量获取文本的嵌入向量
+        
+        默认不经过内存LRU缓存，避免目录扫描等批量导入挤掉热点查询向量。
+        
+        Args:
+            texts: 文本列表
+            batch_size: 批处理大小
+            use_lru: 是否读写内存LRU缓存
+            
+        Returns:
+            numpy.ndarray: 嵌入向量数组
+        """
+        if not use_lru or self.lru_size <= 0:
+            return self._load_batch_embeddings(texts, batch_size)
+        
+        # 先查内存LRU缓存，只对未命中的文本走磁盘缓存和模型
+        keys = [self._lru_key(text) for text in texts]
+        embeddings = [self._lru_get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            loaded = self._load_batch_embeddings([texts[i] for i in missing], batch_size)
+            for j, i in enumerate(missing):
+                embeddings[i] = loaded[j].copy()
+                self._lru_put(keys[i], embeddings[i])
+        
+        return np.stack(embeddings).astype(np.float32, copy=False)
+    
+    def _load_batch_embeddings(self, texts: list[str], batch_size: int) -> np.ndarray:
+        """从磁盘缓存批量读取嵌入向量，未命中的文本去重后批量计算"""
+        if self.cache is None:
+            return self._compute_batch_embeddings(texts, batch_size)
+        
+        keys = [self._cache_key(text) for text in texts]
+        cached = [self.cache.get(key) for key in keys]
+        
+        # 未命中的文本按缓存键去重后再计算
+        missing: Dict[bytes, List[int]] = {}
+        for i, embedding in enumerate(cached):
+            if embedding is None:
+                missing.setdefault(keys[i], []).append(i)
+        
+        if missing:
+            positions = list(missing.values())
+            computed = self._compute_batch_embeddings(
+                [texts[indices[0]] for indices in positions], batch_size
+            )
+            self.cache.set_many(list(zip(missing.keys(), computed)))
+            for j, indices in enumerate(positions):
+                for i in indices:
+                    cached[i] = computed[j]
+        
+        return np.stack(cached).astype(np.float32, copy=False)
+    
+    def _compute_batch_embeddings(self, texts: list[str], batch_size: int) -> np.ndarray:
+        """运行模型批量计算嵌入向量"""
+        # 按文本长度排序，使每个批次只填充到相近的长度
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+        
+        embeddings = np.concatenate([
+            self._encode(sorted_texts[i:i + batch_size])
+            for i in range(0, len(sorted_texts), batch_size)
+        ], axis=0)
+        
+        # 还原为调用方的输入顺序
+        result = np.empty_like(embeddings)
+        result[order] = embeddings
+        return result
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """
+        对一个批次的文本执行前向计算和池化
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            numpy.ndarray: float32嵌入向量数组
         """
         # 准备输入
         inputs = self.tokenizer(
-            text,
+            texts,
             return_tensors="pt",
             padding=True,
             truncation=True,
             max_length=self.max_length
         )
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
         
         # 获取嵌入
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            embeddings = outputs.last_hidden_state
-            
-            # 池化策略
-            if self.pooling_strategy == "mean":
-                embeddings = embeddings.mean(dim=1)
-            elif self.pooling_strategy == "cls":
-                embeddings = embeddings[:, 0]
-            elif self.pooling_strategy == "max":
-                embeddings = embeddings.max(dim=1)[0]
+        with torch.inference_mode():
+            last_hidden_state = self.backend.forward(inputs)
+            embeddings = self._pool(last_hidden_state, inputs["attention_mask"])
         
-        return embeddings.cpu().numpy()[0]
+        return embeddings.cpu().numpy()
     
-    def batch_get_embeddings(self, texts: list[str], batch_size: int = 32) -> np.ndarray:
+    def _pool(self, last_hidden_state: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
         """
-        批量获取文本的嵌入向量
+        按池化策略聚合token向量，填充位置不参与计算
         
         Args:
-            texts: 文本列表
-            batch_size: 批处理大小
+            last_hidden_state: 模型最后一层输出
+            attention_mask: 注意力掩码
             
         Returns:
-            numpy.ndarray: 嵌入向量数组
+            torch.Tensor: float32句向量
         """
-        embeddings = []
+        hidden = last_hidden_state.float()
+        mask = attention_mask.to(hidden.device).unsqueeze(-1).to(hidden.dtype)
         
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            inputs = self.tokenizer(
-                batch_texts,
-                return_tensors="pt",
-                padding=True,
-                truncation=True,
-                max_length=self.max_length
-            )
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                batch_embeddings = outputs.last_hidden_state
-                
-                if self.pooling_strategy == "mean":
-                    batch_embeddings = batch_embeddings.mean(dim=1)
-                elif self.pooling_strategy == "cls":
-                    batch_embeddings = batch_embeddings[:, 0]
-                elif self.pooling_strategy == "max":
-                    batch_embeddings = batch_embeddings.max(dim=1)[0]
-                
-                embeddings.append(batch_embeddings.cpu().numpy())
-        
-        return np.concatenate(embeddings, axis=0)
+        if self.pooling_strategy == "cls":
+            return hidden[:, 0]
+        if self.pooling_strategy == "max":
+            return hidden.masked_fill(mask == 0, float("-inf")).max(dim=1)[0]
+        
+        summed = (hidden * mask).sum(dim=1)
+        counts = mask.sum(dim=1).clamp(min=1e-9)
+        return summed / counts
+    
+    def _cache_key(self, text: str) -> bytes:
+        """生成与模型、推理后端、池化策略和截断长度绑定的缓存键"""
+        key = f"{self.model_name}|{self._backend_tag()}|{self.pooling_strategy}|{self.max_length}|{text}"
+        return hashlib.sha256(key.encode("utf-8")).digest()
+    
+    def _backend_tag(self) -> str:
+        """区分不同推理后端产生的向量，量化模型的输出与原模型不完全一致"""
+        if self.backend_name == "onnx":
+            return "onnx-int8" if self.quantize else "onnx"
+        return self.backend_name
     
     def save_config(self, path: str):
         """
@@ -131,6 +439,11 @@ class EmbeddingManager:
             "model_name": self.model_name,
             "device": str(self.device),
             "cache_dir": self.cache_dir,
+            "cache_path": self.cache_path,
+            "lru_size": self.lru_size,
+            "compile_model": self.compile_model,
+            "backend": self.backend_name,
+            "quantize": self.quantize,
             "max_length": self.max_length,
             "pooling_strategy": self.pooling_strategy
         }
@@ -155,7 +468,12 @@ class EmbeddingManager:
         instance = cls(
             model_name=config["model_name"],
             device=config["device"],
-            cache_dir=config["cache_dir"]
+            cache_dir=config["cache_dir"],
+            cache_path=config.get("cache_path"),
+            lru_size=config.get("lru_size", 4096),
+            compile_model=config.get("compile_model", False),
+            backend=config.get("backend", "torch"),
+            quantize=config.get("quantize", True)
         )
         instance.max_length = config["max_length"]
         instance.pooling_strategy = config["pooling_strategy"]
@@ -163,4 +481,4 @@ class EmbeddingManager:
         return instance
     
     def __repr__(self) -> str:
-        return f"EmbeddingManager(model={self.model_name}, device={self.device})" 
\ No newline at end of file
+        return f"EmbeddingManager(model={self.model_name}, device={self.device}, backend={self._backend_tag()})" 
\ No newline at end of file
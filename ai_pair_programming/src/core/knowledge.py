@@ -4,18 +4,39 @@
 管理和检索项目相关的知识。
 """
 
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Any, Tuple, Protocol
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Tuple, Protocol, Set, Iterator
 import numpy as np
 from pathlib import Path
 import json
 import yaml
 import hashlib
+import heapq
+import os
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from abc import ABC, abstractmethod
 
 from .embedding import EmbeddingManager
 
+try:
+    import faiss
+except ImportError:  # faiss为可选依赖，未安装时使用NumPy矩阵检索
+    faiss = None
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时使用标准库json
+    orjson = None
+
+# 内容处理器使用的预编译正则表达式
+_MD_TITLE_RE = re.compile(r'^#\s+(.+)$', re.MULTILINE)
+_MD_TAGS_RE = re.compile(r'(?:tags:|#)([a-zA-Z0-9_\-]+)')
+_PY_DOC_RE = re.compile(r'"""(.+?)"""', re.DOTALL)
+_PY_DEF_RE = re.compile(r'(?:def|class)\s+([a-zA-Z0-9_]+)')
+
 @dataclass
 class KnowledgeItem:
     """知识条目"""
@@ -26,25 +47,32 @@ class KnowledgeItem:
     tags: List[str]
     source_file: Optional[str] = None
     embedding: Optional[np.ndarray] = None
-    metadata: Dict[str, Any] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
     
-    def to_dict(self) -> Dict[str, Any]:
-        """转换为字典格式"""
-        return {
+    def to_dict(self, include_embedding: bool = True) -> Dict[str, Any]:
+        """
+        转换为字典格式
+        
+        Args:
+            include_embedding: 是否包含嵌入向量，为空时不输出该字段
+        """
+        data = {
             "id": self.id,
             "title": self.title,
             "content": self.content,
             "category": self.category,
             "tags": self.tags,
             "source_file": self.source_file,
-            "embedding": self.embedding.tolist() if self.embedding is not None else None,
-            "metadata": self.metadata or {}
+            "metadata": self.metadata if self.metadata is not None else {}
         }
+        if include_embedding and self.embedding is not None:
+            data["embedding"] = self.embedding.tolist()
+        return data
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "KnowledgeItem":
         """从字典创建实例"""
-        embedding = np.array(data["embedding"]) if data.get("embedding") else None
+        embedding = np.asarray(data["embedding"], dtype=np.float16) if data.get("embedding") else None
         return cls(
             id=data["id"],
             title=data["title"],
@@ -53,7 +81,7 @@ class KnowledgeItem:
             tags=data["tags"],
             source_file=data.get("source_file"),
             embedding=embedding,
-            metadata=data.get("metadata", {})
+            metadata=data.get("metadata") or {}
         )
 
 class ContentProcessor(Protocol):
@@ -65,14 +93,12 @@ class MarkdownProcessor:
     """Markdown文件处理器"""
     def extract_content(self, content: str) -> Tuple[str, str, List[str]]:
         """提取Markdown内容"""
-        import re
-        
         # 提取标题
-        title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+        title_match = _MD_TITLE_RE.search(content)
         title = title_match.group(1) if title_match else "Untitled"
         
         # 提取标签
-        tags = re.findall(r'(?:tags:|#)([a-zA-Z0-9_\-]+)', content)
+        tags = _MD_TAGS_RE.findall(content)
         
         return title, content, tags
     
@@ -83,10 +109,8 @@ class PythonProcessor:
     """Python文件处理器"""
     def extract_content(self, content: str) -> Tuple[str, str, List[str]]:
         """提取Python文件内容"""
-        import re
-        
         # 提取文档字符串作为标题
-        docstring_match = re.search(r'"""(.+?)"""', content, re.DOTALL)
+        docstring_match = _PY_DOC_RE.search(content)
         title = ""
         if docstring_match:
             docstring = docstring_match.group(1).strip()
@@ -94,7 +118,7 @@ class PythonProcessor:
             title = first_line
         
         # 提取函数和类名作为标签
-        tags = re.findall(r'(?:def|class)\s+([a-zA-Z0-9_]+)', content)
+        tags = _PY_DEF_RE.findall(content)
         
         return title or "Python Module", content, tags
     
@@ -113,8 +137,23 @@ class KnowledgeBase:
         """
         self.embedding_manager = embedding_manager
         self.knowledge_items: Dict[str, KnowledgeItem] = {}
-        self.categories: Dict[str, List[str]] = {}
-        self.tags: Dict[str, List[str]] = {}
+        self.categories: Dict[str, Set[str]] = {}
+        self.tags: Dict[str, Set[str]] = {}
+        
+        # 归一化float16嵌入矩阵，行号与 _id_order 一一对应
+        self._emb_matrix: Optional[np.ndarray] = None
+        self._id_order: List[str] = []
+        self._id_index: Dict[str, int] = {}
+        
+        # 源文件 -> 内容哈希，用于重复扫描时跳过未变化的文件
+        self._file_hashes: Dict[str, str] = {}
+        
+        # 保护索引结构，扫描目录时读取线程会并发访问 _file_hashes
+        self._lock = threading.Lock()
+        
+        # FAISS内积索引（向量已归一化，内积即余弦相似度）
+        self.index = None
+        self._index_dirty = False
         
         # 注册默认处理器
         self.processors: Dict[str, ContentProcessor] = {
@@ -132,23 +171,74 @@ class KnowledgeBase:
         for ext in processor.supported_extensions():
             self.processors[ext] = processor
     
-    def scan_directory(self, directory_path: str, recursive: bool = True):
+    def scan_directory(
+        self,
+        directory_path: str,
+        recursive: bool = True,
+        batch_size: int = 32,
+        max_workers: Optional[int] = None
+    ):
         """
         扫描目录并导入知识
         
+        文件读取和内容提取在线程池中并行执行，当前线程按批次计算嵌入向量，
+        使磁盘读取与模型推理重叠进行。
+        
         Args:
             directory_path: 目录路径
             recursive: 是否递归扫描子目录
+            batch_size: 嵌入计算的批处理大小
+            max_workers: 读取文件的线程数，None表示使用CPU核数
+        """
+        file_paths = list(self._iter_files(directory_path, recursive))
+        
+        batch = []
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            for item in executor.map(self._try_load_file, file_paths):
+                if item is None:
+                    continue
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    self.add_items(batch, batch_size)
+                    batch = []
+        
+        if batch:
+            self.add_items(batch, batch_size)
+    
+    def _try_load_file(self, file_path: Path) -> Optional[KnowledgeItem]:
+        """读取文件，出错时打印错误并返回None"""
+        try:
+            return self._load_file(file_path)
+        except Exception as e:
+            print(f"Error importing {file_path}: {str(e)}")
+            return None
+    
+    def _iter_files(self, directory_path: str, recursive: bool) -> Iterator[Path]:
         """
-        base_path = Path(directory_path)
-        pattern = "**/*" if recursive else "*"
+        使用 os.scandir 遍历目录中受支持的文件，跳过隐藏文件和目录
         
-        for file_path in base_path.glob(pattern):
-            if file_path.is_file() and file_path.suffix in self.processors:
-                try:
-                    self.import_file(file_path)
-                except Exception as e:
-                    print(f"Error importing {file_path}: {str(e)}")
+        Args:
+            directory_path: 目录路径
+            recursive: 是否递归扫描子目录
+            
+        Yields:
+            Path: 文件路径
+        """
+        pending = [directory_path]
+        while pending:
+            current = pending.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                pending.append(entry.path)
+                        elif entry.is_file() and os.path.splitext(entry.name)[1] in self.processors:
+                            yield Path(entry.path)
+            except OSError as e:
+                print(f"Error scanning {current}: {str(e)}")
     
     def import_file(self, file_path: Path):
         """
@@ -157,26 +247,49 @@ class KnowledgeBase:
         Args:
             file_path: 文件路径
         """
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        item = self._load_file(file_path)
+        if item is not None:
+            self.add_item(item)
+    
+    def _load_file(self, file_path: Path) -> Optional[KnowledgeItem]:
+        """
+        读取文件并创建未计算嵌入向量的知识条目
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            Optional[KnowledgeItem]: 知识条目，文件不受支持或内容未变化时返回None
+        """
+        file_path = Path(file_path)
+        raw = file_path.read_bytes()
+        content = raw.decode('utf-8', 'replace')
         
         processor = self.processors.get(file_path.suffix)
         if not processor:
-            return
+            return None
         
         # 提取内容
         title, content, tags = processor.extract_content(content)
         
-        # 生成唯一ID
-        file_id = hashlib.md5(
-            f"{file_path}:{hash(content)}".encode()
-        ).hexdigest()[:12]
+        # 对路径和文件内容只计算一次哈希，既作为跨进程稳定的ID，也用于变化检测
+        digest = hashlib.blake2b(digest_size=6)
+        digest.update(str(file_path).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(raw)
+        file_id = digest.hexdigest()
+        
+        # 内容未变化时跳过，避免重复计算嵌入向量
+        with self._lock:
+            unchanged = self._file_hashes.get(str(file_path)) == file_id
+        if unchanged:
+            return None
         
         # 使用父目录作为分类
         category = file_path.parent.name or "general"
         
         # 创建知识条目
-        item = KnowledgeItem(
+        return KnowledgeItem(
             id=file_id,
             title=title,
             content=content,
@@ -186,11 +299,10 @@ class KnowledgeBase:
             metadata={
                 "file_type": file_path.suffix,
                 "imported_at": time.time(),
-                "file_size": file_path.stat().st_size
+                "file_size": len(raw),
+                "content_hash": file_id
             }
         )
-        
-        self.add_item(item)
     
     def add_item(self, item: KnowledgeItem):
         """
@@ -200,22 +312,79 @@ class KnowledgeBase:
             item: 知识条目
         """
         # 生成嵌入向量
+        self._reuse_embedding(item)
         if item.embedding is None:
             item.embedding = self.embedding_manager.get_embedding(
                 f"{item.title}\n{item.content}"
             )
         
-        self.knowledge_items[item.id] = item
+        self._index_item(item)
+    
+    def add_items(self, items: List[KnowledgeItem], batch_size: int = 32):
+        """
+        批量添加知识条目，缺少嵌入向量的条目合并为批次计算
+        
+        Args:
+            items: 知识条目列表
+            batch_size: 批处理大小
+        """
+        for item in items:
+            self._reuse_embedding(item)
+        
+        pending = [item for item in items if item.embedding is None]
+        if pending:
+            embeddings = self.embedding_manager.batch_get_embeddings(
+                [f"{item.title}\n{item.content}" for item in pending],
+                batch_size=batch_size
+            )
+            for item, embedding in zip(pending, embeddings):
+                item.embedding = embedding
         
-        # 更新索引
-        if item.category not in self.categories:
-            self.categories[item.category] = []
-        self.categories[item.category].append(item.id)
+        for item in items:
+            self._index_item(item)
+    
+    def _reuse_embedding(self, item: KnowledgeItem):
+        """
+        同ID且内容相同的条目已存在时复用其嵌入向量
         
-        for tag in item.tags:
-            if tag not in self.tags:
-                self.tags[tag] = []
-            self.tags[tag].append(item.id)
+        Args:
+            item: 知识条目
+        """
+        if item.embedding is not None:
+            return
+        existing = self.knowledge_items.get(item.id)
+        if existing is not None and existing.title == item.title and existing.content == item.content:
+            item.embedding = existing.embedding
+    
+    def _index_item(self, item: KnowledgeItem):
+        """
+        将已有嵌入向量的知识条目写入存储和索引
+        
+        Args:
+            item: 知识条目
+        """
+        # 插入时归一化一次，并以float16保存以减半内存占用
+        vector = np.asarray(item.embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        item.embedding = vector.astype(np.float16)
+        
+        with self._lock:
+            self.knowledge_items[item.id] = item
+            self._store_embedding(item.id, item.embedding)
+            
+            if item.source_file and item.metadata and "content_hash" in item.metadata:
+                # 文件内容变化后ID随之变化，移除该文件旧版本的条目
+                previous = self._file_hashes.get(item.source_file)
+                if previous is not None and previous != item.id and previous in self.knowledge_items:
+                    self._remove_item(previous)
+                self._file_hashes[item.source_file] = item.metadata["content_hash"]
+            
+            # 更新索引
+            self.categories.setdefault(item.category, set()).add(item.id)
+            for tag in item.tags:
+                self.tags.setdefault(tag, set()).add(item.id)
     
     def query(
         self,
@@ -223,7 +392,8 @@ class KnowledgeBase:
         k: int = 3,
         category: Optional[str] = None,
         tags: Optional[List[str]] = None,
-        threshold: float = 0.5
+        threshold: float = 0.5,
+        query_embedding: Optional[np.ndarray] = None
     ) -> List[Tuple[KnowledgeItem, float]]:
         """
         查询知识库
@@ -234,59 +404,188 @@ class KnowledgeBase:
             category: 筛选分类
             tags: 筛选标签
             threshold: 相似度阈值
+            query_embedding: 预先计算的查询向量，提供时不再重复编码
             
         Returns:
             List[Tuple[KnowledgeItem, float]]: 知识条目和相似度得分列表
         """
-        query_embedding = self.embedding_manager.get_embedding(query_text)
+        n = len(self._id_order)
+        if n == 0 or k <= 0:
+            return []
+        
+        if query_embedding is None:
+            query_embedding = self.embedding_manager.get_embedding(query_text)
+        query_vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+        query_norm = np.linalg.norm(query_vector)
+        if query_norm == 0:
+            return []
+        
+        query_vector = query_vector / query_norm
         
-        # 筛选候选项
-        candidate_items = self.knowledge_items.values()
+        # 无筛选条件时直接使用FAISS索引
+        if self.index is not None and not (category or tags):
+            return self._search_index(query_vector, k, threshold)
+        
+        # 通过倒排索引的集合运算确定候选项，只对候选行计算相似度
+        allowed_ids: Optional[Set[str]] = None
         if category:
-            category_items = set(self.categories.get(category, []))
-            candidate_items = [
-                item for item in candidate_items
-                if item.id in category_items
-            ]
+            allowed_ids = self.categories.get(category, set())
         
         if tags:
-            tagged_items = set()
-            for tag in tags:
-                tagged_items.update(self.tags.get(tag, []))
-            candidate_items = [
-                item for item in candidate_items
-                if item.id in tagged_items
-            ]
+            tagged_ids = set().union(*(self.tags.get(tag, set()) for tag in tags))
+            allowed_ids = tagged_ids if allowed_ids is None else allowed_ids & tagged_ids
+        
+        if allowed_ids is None:
+            rows = np.arange(n)
+            sims = self._emb_matrix[:n].astype(np.float32) @ query_vector
+        else:
+            if not allowed_ids:
+                return []
+            rows = np.fromiter(
+                (self._id_index[item_id] for item_id in allowed_ids),
+                dtype=np.intp,
+                count=len(allowed_ids)
+            )
+            sims = self._emb_matrix[rows].astype(np.float32) @ query_vector
+        
+        # 先按阈值筛选，再对剩余候选部分排序取前k个
+        top = np.flatnonzero(sims >= threshold)
+        if len(top) > k:
+            top = top[np.argpartition(-sims[top], k - 1)[:k]]
+        top = top[np.argsort(-sims[top])]
         
-        # 计算相似度
-        similarities = [
-            (item, float(np.dot(query_embedding, item.embedding) /
-                       (np.linalg.norm(query_embedding) * np.linalg.norm(item.embedding))))
-            for item in candidate_items
+        return [
+            (self.knowledge_items[self._id_order[rows[i]]], float(sims[i]))
+            for i in top
         ]
+    
+    def _search_index(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        threshold: float
+    ) -> List[Tuple[KnowledgeItem, float]]:
+        """
+        使用FAISS索引检索
+        
+        Args:
+            query_vector: 归一化后的查询向量
+            k: 返回结果数量
+            threshold: 相似度阈值
+            
+        Returns:
+            List[Tuple[KnowledgeItem, float]]: 知识条目和相似度得分列表
+        """
+        if self._index_dirty:
+            self.index.reset()
+            self.index.add(self._emb_matrix[:len(self._id_order)].astype(np.float32))
+            self._index_dirty = False
+        
+        scores, rows = self.index.search(query_vector[None, :], min(k, len(self._id_order)))
         
-        # 筛选并排序
-        relevant_items = [
-            (item, sim) for item, sim in similarities
-            if sim >= threshold
+        return [
+            (self.knowledge_items[self._id_order[row]], float(score))
+            for row, score in zip(rows[0], scores[0])
+            if row >= 0 and score >= threshold
         ]
-        relevant_items.sort(key=lambda x: x[1], reverse=True)
+    
+    def _store_embedding(self, item_id: str, embedding: np.ndarray):
+        """
+        将归一化后的嵌入向量写入矩阵
+        
+        Args:
+            item_id: 知识条目ID
+            embedding: 归一化后的float16嵌入向量
+        """
+        row = self._id_index.get(item_id)
+        if row is None:
+            row = len(self._id_order)
+            if self._emb_matrix is None:
+                self._emb_matrix = np.zeros((16, embedding.shape[0]), dtype=np.float16)
+            elif row >= self._emb_matrix.shape[0]:
+                # 容量不足时成倍扩容
+                grown = np.zeros(
+                    (self._emb_matrix.shape[0] * 2, self._emb_matrix.shape[1]),
+                    dtype=np.float16
+                )
+                grown[:row] = self._emb_matrix[:row]
+                self._emb_matrix = grown
+            self._id_order.append(item_id)
+            self._id_index[item_id] = row
+            
+            if faiss is not None:
+                if self.index is None:
+                    self.index = faiss.IndexFlatIP(embedding.shape[0])
+                if not self._index_dirty:
+                    self.index.add(embedding[None, :].astype(np.float32))
+        else:
+            # 平面索引不支持原地更新，下次查询前重建
+            self._index_dirty = True
+        
+        self._emb_matrix[row] = embedding
+    
+    def _remove_item(self, item_id: str):
+        """
+        移除知识条目，矩阵末行移入空出的行（调用方需持有 _lock）
+        
+        Args:
+            item_id: 知识条目ID
+        """
+        item = self.knowledge_items.pop(item_id)
         
-        return relevant_items[:k]
+        ids = self.categories.get(item.category)
+        if ids is not None:
+            ids.discard(item_id)
+            if not ids:
+                del self.categories[item.category]
+        for tag in item.tags:
+            ids = self.tags.get(tag)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self.tags[tag]
+        
+        row = self._id_index.pop(item_id)
+        last_id = self._id_order.pop()
+        if last_id != item_id:
+            self._emb_matrix[row] = self._emb_matrix[len(self._id_order)]
+            self._id_order[row] = last_id
+            self._id_index[last_id] = row
+        
+        # 平面索引不支持删除，下次查询前重建
+        self._index_dirty = True
     
     def save_knowledge_base(self, path: str):
         """
         保存知识库到文件
         
+        条目元数据写入JSON文件，嵌入向量按条目顺序写入同名的 .embeddings.npy 文件。
+        
         Args:
             path: 保存路径
         """
         data = {
-            "items": [item.to_dict() for item in self.knowledge_items.values()]
+            "items": [
+                self.knowledge_items[item_id].to_dict(include_embedding=False)
+                for item_id in self._id_order
+            ]
         }
         
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            with open(path, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        
+        embeddings_path = self._embeddings_path(path)
+        if self._id_order:
+            # 先写临时文件再替换，已加载的内存映射仍指向旧文件
+            with open(f"{embeddings_path}.tmp", 'wb') as f:
+                np.save(f, self._emb_matrix[:len(self._id_order)])
+            os.replace(f"{embeddings_path}.tmp", embeddings_path)
+        elif Path(embeddings_path).exists():
+            os.remove(embeddings_path)
     
     def load_knowledge_base(self, path: str):
         """
@@ -295,18 +594,50 @@ class KnowledgeBase:
         Args:
             path: 知识库文件路径
         """
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if orjson is not None:
+            with open(path, 'rb') as f:
+                data = orjson.loads(f.read())
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
         
         # 清空当前知识库
         self.knowledge_items.clear()
         self.categories.clear()
         self.tags.clear()
+        self._emb_matrix = None
+        self._id_order = []
+        self._id_index = {}
+        self._file_hashes = {}
+        self.index = None
+        self._index_dirty = False
+        
+        # 内存映射读取嵌入向量，行号与条目顺序一致
+        embeddings_path = self._embeddings_path(path)
+        embeddings = None
+        if Path(embeddings_path).exists():
+            embeddings = np.load(embeddings_path, mmap_mode='r')
+            # 行数与条目数不一致时无法按行对应，避免条目和嵌入向量错位
+            if len(embeddings) != len(data["items"]):
+                raise ValueError(
+                    f"Embedding file {embeddings_path} has {len(embeddings)} rows, "
+                    f"expected {len(data['items'])}"
+                )
         
         # 加载知识条目
-        for item_data in data["items"]:
+        items = []
+        for row, item_data in enumerate(data["items"]):
             item = KnowledgeItem.from_dict(item_data)
-            self.add_item(item)
+            if item.embedding is None and embeddings is not None:
+                item.embedding = embeddings[row]
+            items.append(item)
+        
+        self.add_items(items)
+    
+    @staticmethod
+    def _embeddings_path(path: str) -> str:
+        """嵌入向量文件路径"""
+        return f"{path}.embeddings.npy"
     
     def get_statistics(self) -> Dict[str, Any]:
         """
@@ -322,11 +653,12 @@ class KnowledgeBase:
                 for category, items in self.categories.items()
             },
             "total_tags": len(self.tags),
-            "popular_tags": sorted(
-                [(tag, len(items)) for tag, items in self.tags.items()],
-                key=lambda x: x[1],
-                reverse=True
-            )[:10]
+            # 只取前10个，无需对全部标签排序
+            "popular_tags": heapq.nlargest(
+                10,
+                ((tag, len(items)) for tag, items in self.tags.items()),
+                key=lambda x: x[1]
+            )
         }
     
     def __len__(self) -> int:
@@ -5,40 +5,140 @@
 """
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, Deque
 import numpy as np
 from datetime import datetime
 import json
+import os
+from collections import deque
+from itertools import compress
 from pathlib import Path
 import time
 
 from .embedding import EmbeddingManager
 
+try:
+    import faiss
+except ImportError:  # faiss为可选依赖，未安装时始终线性扫描
+    faiss = None
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时使用标准库json
+    orjson = None
+
+try:
+    import simsimd
+except ImportError:  # simsimd为可选依赖，未安装时使用Numba或NumPy计算
+    simsimd = None
+
+try:
+    import numba
+except ImportError:  # numba为可选依赖，未安装时使用NumPy矩阵乘法
+    numba = None
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _scaled_dot_rows(matrix, query, scales, out):
+        """并行计算矩阵各行与查询向量的点积并乘以行缩放系数"""
+        for i in numba.prange(matrix.shape[0]):
+            acc = np.float32(0.0)
+            for j in range(matrix.shape[1]):
+                acc += matrix[i, j] * query[j]
+            out[i] = acc * scales[i]
+
+
+# 检索时按块跳过没有候选项的行，块内仍批量计算相似度
+_BLOCK_SIZE = 64
+
+
+def _quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按行对称量化为int8
+    
+    Args:
+        vectors: float32向量矩阵
+        
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: int8矩阵和每行的缩放系数
+    """
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _cosine_scores(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    scales: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    批量计算查询向量与矩阵各行的余弦相似度
+    
+    Args:
+        matrix: 归一化后的嵌入矩阵（float32，或int8量化矩阵）
+        query: 归一化后的查询向量
+        scales: int8矩阵每行的缩放系数
+        
+    Returns:
+        np.ndarray: 各行的相似度
+    """
+    if matrix.dtype == np.int8:
+        if simsimd is not None:
+            # 余弦相似度与缩放无关，查询同样量化后直接使用int8内核
+            query_i8, _ = _quantize_int8(query[None, :])
+            distances = np.asarray(simsimd.cdist(query_i8, matrix, metric="cosine"))[0]
+            return 1.0 - distances
+    elif simsimd is not None:
+        distances = np.asarray(simsimd.cdist(query[None, :], matrix, metric="cosine"))[0]
+        return 1.0 - distances
+    
+    if scales is None:
+        scales = np.ones(matrix.shape[0], dtype=np.float32)
+    
+    if numba is not None:
+        out = np.empty(matrix.shape[0], dtype=np.float32)
+        _scaled_dot_rows(matrix, query.astype(np.float32, copy=False), scales, out)
+        return out
+    
+    if matrix.dtype == np.int8:
+        return (matrix @ query) * scales
+    return matrix @ query
+
 @dataclass
 class Memory:
-    """记忆单元"""
+    """记忆单元（MemorySystem按列存储，检索结果按需构建为该视图）"""
     content: str
     embedding: np.ndarray
     timestamp: float
     type: str  # 'conversation', 'code', 'prompt'
     metadata: Optional[Dict[str, Any]] = None
     
-    def to_dict(self) -> Dict[str, Any]:
-        """转换为字典格式"""
-        return {
+    def to_dict(self, include_embedding: bool = True) -> Dict[str, Any]:
+        """
+        转换为字典格式
+        
+        Args:
+            include_embedding: 是否包含嵌入向量
+        """
+        data = {
             "content": self.content,
-            "embedding": self.embedding.tolist(),
             "timestamp": self.timestamp,
             "type": self.type,
             "metadata": self.metadata or {}
         }
+        if include_embedding:
+            data["embedding"] = np.asarray(self.embedding, dtype=np.float32).tolist()
+        return data
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Memory":
         """从字典创建实例"""
         return cls(
             content=data["content"],
-            embedding=np.array(data["embedding"]),
+            embedding=np.asarray(data["embedding"], dtype=np.float32),
             timestamp=data["timestamp"],
             type=data["type"],
             metadata=data["metadata"]
@@ -51,7 +151,9 @@ class MemorySystem:
         self,
         embedding_manager: EmbeddingManager,
         memory_threshold: float = 0.7,
-        max_memories: int = 1000
+        max_memories: int = 1000,
+        quantize_embeddings: bool = False,
+        faiss_threshold: int = 10000
     ):
         """
         初始化记忆系统
@@ -60,17 +162,42 @@ class MemorySystem:
             embedding_manager: 嵌入向量管理器
             memory_threshold: 记忆相似度阈值
             max_memories: 最大记忆数量
+            quantize_embeddings: 是否以int8量化形式保存检索矩阵
+            faiss_threshold: 记忆数量超过该值时使用FAISS倒排索引检索
         """
         self.embedding_manager = embedding_manager
         self.memory_threshold = memory_threshold
         self.max_memories = max_memories
-        self.memories: List[Memory] = []
+        self.quantize_embeddings = quantize_embeddings
+        self.faiss_threshold = faiss_threshold
+        # 按列存储记忆，容量固定的双端队列在追加超出上限时自动丢弃最旧的记忆
+        self._contents: Deque[str] = deque(maxlen=max_memories)
+        self._embeddings: Deque[np.ndarray] = deque(maxlen=max_memories)
+        self._metadatas: Deque[Optional[Dict[str, Any]]] = deque(maxlen=max_memories)
+        
+        # 与上述队列按行对应的数值列：归一化的嵌入矩阵、类型编码和时间戳
+        self._emb_matrix: Optional[np.ndarray] = None
+        self._types_i8 = np.empty(0, dtype=np.uint8)
+        self._timestamps = np.empty(0, dtype=np.float64)
+        self._scales = np.empty(0, dtype=np.float32)
+        # 有效行位于 [_head, _head + _size)，淘汰时只需前移起点
+        self._head = 0
+        self._size = 0
+        
+        # FAISS倒排索引按需构建，以递增序号作为ID，_seq_head为首个有效行的序号
+        self.index = None
+        self._seq_head = 0
+        
+        # 记忆类型与uint8编码的双向映射
+        self._type_codes: Dict[str, int] = {}
+        self._type_names: List[str] = []
     
     def add_memory(
         self,
         content: str,
         memory_type: str,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding: Optional[np.ndarray] = None
     ) -> Memory:
         """
         添加新记忆
@@ -79,34 +206,268 @@ class MemorySystem:
             content: 记忆内容
             memory_type: 记忆类型
             metadata: 元数据
+            embedding: 预先计算的嵌入向量，提供时不再重复编码
             
         Returns:
             Memory: 新创建的记忆
         """
-        embedding = self.embedding_manager.get_embedding(content)
-        memory = Memory(
+        if embedding is None:
+            embedding = self.embedding_manager.get_embedding(content)
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+        timestamp = time.time()
+        
+        self._contents.append(content)
+        self._embeddings.append(embedding)
+        self._metadatas.append(metadata)
+        self._append_rows(embedding.reshape(1, -1), [memory_type], [timestamp])
+        self._evict_overflow()
+        
+        return Memory(
             content=content,
             embedding=embedding,
-            timestamp=time.time(),
+            timestamp=timestamp,
             type=memory_type,
             metadata=metadata
         )
+    
+    def add_memories_batch(
+        self,
+        contents: List[str],
+        memory_types: List[str],
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+        embeddings: Optional[List[Optional[np.ndarray]]] = None
+    ) -> List[Memory]:
+        """
+        批量添加记忆，缺少嵌入向量的内容合并为一次批量编码
+        
+        Args:
+            contents: 记忆内容列表
+            memory_types: 记忆类型列表
+            metadatas: 元数据列表
+            embeddings: 预先计算的嵌入向量列表，元素为None时需要编码
+            
+        Returns:
+            List[Memory]: 新创建的记忆列表
+        """
+        metadatas = metadatas or [None] * len(contents)
+        embeddings = list(embeddings) if embeddings else [None] * len(contents)
+        
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            # 记忆内容常被再次检索，批量写入时同样进入内存LRU缓存
+            computed = self.embedding_manager.batch_get_embeddings(
+                [contents[i] for i in missing], use_lru=True
+            )
+            for j, i in enumerate(missing):
+                embeddings[i] = computed[j]
+        embeddings = [np.ascontiguousarray(embedding, dtype=np.float32) for embedding in embeddings]
+        
+        if not contents:
+            return []
         
-        self.memories.append(memory)
+        timestamp = time.time()
+        self._contents.extend(contents)
+        self._embeddings.extend(embeddings)
+        self._metadatas.extend(metadatas)
+        self._append_rows(
+            np.stack([embedding.ravel() for embedding in embeddings]),
+            memory_types,
+            [timestamp] * len(contents)
+        )
+        self._evict_overflow()
         
-        # 如果超过最大记忆数量，删除最旧的记忆
-        if len(self.memories) > self.max_memories:
-            self.memories.sort(key=lambda x: x.timestamp)
-            self.memories = self.memories[-self.max_memories:]
+        return [
+            Memory(
+                content=content,
+                embedding=embedding,
+                timestamp=timestamp,
+                type=memory_type,
+                metadata=metadata
+            )
+            for content, memory_type, metadata, embedding
+            in zip(contents, memory_types, metadatas, embeddings)
+        ]
+    
+    @property
+    def memories(self) -> List[Memory]:
+        """
+        全部记忆的视图列表，按需构建
         
-        return memory
+        Returns:
+            List[Memory]: 按时间顺序排列的记忆
+        """
+        rows = slice(self._head, self._head + self._size)
+        return [
+            Memory(
+                content=content,
+                embedding=embedding,
+                timestamp=timestamp,
+                type=self._type_names[code],
+                metadata=metadata
+            )
+            for content, embedding, metadata, timestamp, code in zip(
+                self._contents,
+                self._embeddings,
+                self._metadatas,
+                self._timestamps[rows].tolist(),
+                self._types_i8[rows].tolist()
+            )
+        ]
+    
+    def _memory(self, i: int) -> Memory:
+        """
+        构建第i条记忆的视图
+        
+        Args:
+            i: 记忆下标（按时间顺序）
+            
+        Returns:
+            Memory: 记忆视图
+        """
+        row = self._head + i
+        return Memory(
+            content=self._contents[i],
+            embedding=self._embeddings[i],
+            timestamp=float(self._timestamps[row]),
+            type=self._type_names[self._types_i8[row]],
+            metadata=self._metadatas[i]
+        )
+    
+    def _evict_overflow(self):
+        """列式存储丢弃已被队列淘汰的最旧记忆"""
+        # 记忆按时间顺序追加，最旧的总在开头，无需排序
+        overflow = self._size - len(self._contents)
+        if overflow > 0:
+            self._head += overflow
+            self._seq_head += overflow
+            self._size -= overflow
+    
+    def _append_rows(
+        self,
+        vectors: np.ndarray,
+        memory_types: List[str],
+        timestamps: List[float]
+    ):
+        """
+        将新记忆追加到数值列，到达缓冲区末尾时整体前移，容量不足时成倍扩容
+        
+        Args:
+            vectors: 新记忆的嵌入矩阵
+            memory_types: 新记忆的类型
+            timestamps: 新记忆的时间戳
+        """
+        if len(vectors) == 0:
+            return
+        
+        # 插入时归一化一次，检索时只需一次矩阵向量乘法
+        norms = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))[:, None]
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        scales = np.ones(len(vectors), dtype=np.float32)
+        if self.quantize_embeddings:
+            vectors, scales = _quantize_int8(vectors)
+        
+        kept = self._size
+        n = kept + len(vectors)
+        if self._emb_matrix is None:
+            capacity = max(16, n)
+            self._emb_matrix = np.zeros((capacity, vectors.shape[1]), dtype=vectors.dtype)
+            self._types_i8 = np.zeros(capacity, dtype=np.uint8)
+            self._timestamps = np.zeros(capacity, dtype=np.float64)
+            self._scales = np.ones(capacity, dtype=np.float32)
+            self._head = 0
+        elif self._head + n > self._emb_matrix.shape[0]:
+            # 保持容量不少于有效行数的两倍，使前移的开销均摊为常数
+            capacity = self._emb_matrix.shape[0]
+            while capacity < 2 * n:
+                capacity *= 2
+            window = slice(self._head, self._head + kept)
+            grown_matrix = np.zeros((capacity, self._emb_matrix.shape[1]), dtype=self._emb_matrix.dtype)
+            grown_matrix[:kept] = self._emb_matrix[window]
+            grown_types = np.zeros(capacity, dtype=np.uint8)
+            grown_types[:kept] = self._types_i8[window]
+            grown_timestamps = np.zeros(capacity, dtype=np.float64)
+            grown_timestamps[:kept] = self._timestamps[window]
+            grown_scales = np.ones(capacity, dtype=np.float32)
+            grown_scales[:kept] = self._scales[window]
+            self._emb_matrix = grown_matrix
+            self._types_i8 = grown_types
+            self._timestamps = grown_timestamps
+            self._scales = grown_scales
+            self._head = 0
+        
+        start = self._head + kept
+        end = self._head + n
+        self._emb_matrix[start:end] = vectors
+        self._scales[start:end] = scales
+        self._types_i8[start:end] = [self._type_code(memory_type) for memory_type in memory_types]
+        self._timestamps[start:end] = timestamps
+        self._size = n
+        
+        if self.index is not None:
+            self.index.add_with_ids(
+                self._dense_rows(slice(start, end)),
+                np.arange(self._seq_head + kept, self._seq_head + n, dtype=np.int64)
+            )
+    
+    def _type_code(self, memory_type: str) -> int:
+        """
+        获取记忆类型的编码，新类型分配下一个编码
+        
+        Args:
+            memory_type: 记忆类型
+            
+        Returns:
+            int: 类型编码
+        """
+        code = self._type_codes.get(memory_type)
+        if code is None:
+            code = len(self._type_names)
+            if code > np.iinfo(np.uint8).max:
+                raise ValueError(f"记忆类型过多，最多支持{np.iinfo(np.uint8).max + 1}种")
+            self._type_codes[memory_type] = code
+            self._type_names.append(memory_type)
+        return code
+    
+    def _dense_rows(self, rows: slice) -> np.ndarray:
+        """取出指定行的float32归一化向量，量化存储时先反量化"""
+        vectors = self._emb_matrix[rows].astype(np.float32)
+        if self.quantize_embeddings:
+            vectors *= self._scales[rows, None]
+        return vectors
+    
+    def _build_index(self):
+        """用当前全部记忆训练并构建IVF索引"""
+        n = self._size
+        vectors = self._dense_rows(slice(self._head, self._head + n))
+        # 每个聚类中心至少需要约39个训练样本
+        nlist = max(1, min(int(np.sqrt(n)), n // 39))
+        
+        quantizer = faiss.IndexFlatIP(vectors.shape[1])
+        index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.nprobe = min(nlist, 10)
+        index.add_with_ids(vectors, np.arange(self._seq_head, self._seq_head + n, dtype=np.int64))
+        self.index = index
+    
+    def _reset_rows(self):
+        """清空数值列和索引"""
+        self._emb_matrix = None
+        self._types_i8 = np.empty(0, dtype=np.uint8)
+        self._timestamps = np.empty(0, dtype=np.float64)
+        self._scales = np.empty(0, dtype=np.float32)
+        self.index = None
+        self._head = 0
+        self._size = 0
+        self._seq_head = 0
     
     def retrieve_relevant_memories(
         self,
         query: str,
         k: int = 3,
         memory_type: Optional[str] = None,
-        time_window: Optional[float] = None
+        time_window: Optional[float] = None,
+        query_embedding: Optional[np.ndarray] = None
     ) -> List[Tuple[Memory, float]]:
         """
         检索相关记忆
@@ -116,57 +477,185 @@ class MemorySystem:
             k: 返回结果数量
             memory_type: 筛选记忆类型
             time_window: 时间窗口（秒）
+            query_embedding: 预先计算的查询向量，提供时不再重复编码
             
         Returns:
             List[Tuple[Memory, float]]: 记忆和相似度得分列表
         """
-        if not self.memories:
+        n = self._size
+        if n == 0 or k <= 0:
             return []
+        rows = slice(self._head, self._head + n)
+        
+        type_code = None
+        if memory_type:
+            type_code = self._type_codes.get(memory_type)
+            if type_code is None:
+                return []
         
-        query_embedding = self.embedding_manager.get_embedding(query)
+        if query_embedding is None:
+            query_embedding = self.embedding_manager.get_embedding(query)
+        query_vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+        query_norm = np.sqrt(np.vdot(query_vector, query_vector))
+        if query_norm == 0:
+            return []
+        query_vector = query_vector / query_norm
         current_time = time.time()
         
-        # 筛选记忆
-        candidate_memories = self.memories
-        if memory_type:
-            candidate_memories = [m for m in candidate_memories if m.type == memory_type]
+        # 记忆较多时先用倒排索引检索，结果不足以确定前k个时退回线性扫描
+        if faiss is not None and n > self.faiss_threshold:
+            results = self._search_index(
+                query_vector, k, type_code, time_window, current_time
+            )
+            if results is not None:
+                return results
+        
+        # 先用类型和时间窗口等廉价列筛选，再只对含有候选项的块计算相似度
+        mask = None
+        if type_code is not None:
+            mask = self._types_i8[rows] == type_code
         if time_window:
-            candidate_memories = [
-                m for m in candidate_memories
-                if current_time - m.timestamp <= time_window
-            ]
+            recent = self._timestamps[rows] >= current_time - time_window
+            mask = recent if mask is None else mask & recent
         
-        # 计算相似度
-        similarities = [
-            (memory, float(np.dot(query_embedding, memory.embedding) /
-                         (np.linalg.norm(query_embedding) * np.linalg.norm(memory.embedding))))
-            for memory in candidate_memories
-        ]
+        if mask is None:
+            sims = _cosine_scores(self._emb_matrix[rows], query_vector, self._scales[rows])
+            top = np.flatnonzero(sims >= self.memory_threshold)
+        else:
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return []
+            sims = self._block_scores(candidates, query_vector)
+            top = candidates[sims[candidates] >= self.memory_threshold]
         
-        # 筛选并排序
-        relevant_memories = [
-            (memory, sim) for memory, sim in similarities
-            if sim >= self.memory_threshold
-        ]
-        relevant_memories.sort(key=lambda x: x[1], reverse=True)
+        # 只对候选部分排序取前k个
+        if len(top) > k:
+            top = top[np.argpartition(-sims[top], k - 1)[:k]]
+        top = top[np.argsort(-sims[top])]
+        
+        return [(self._memory(i), float(sims[i])) for i in top]
+    
+    def _block_scores(self, candidates: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+        """
+        按块计算相似度，只计算包含候选项的块，相邻的块合并为一次批量计算
+        
+        Args:
+            candidates: 通过筛选的记忆下标（升序）
+            query_vector: 归一化后的查询向量
+            
+        Returns:
+            np.ndarray: 各记忆的相似度，未计算的位置为-inf
+        """
+        n = self._size
+        sims = np.full(n, -np.inf, dtype=np.float32)
+        
+        blocks = np.unique(candidates // _BLOCK_SIZE)
+        runs = np.split(blocks, np.flatnonzero(np.diff(blocks) > 1) + 1)
+        for run in runs:
+            start = int(run[0]) * _BLOCK_SIZE
+            end = min((int(run[-1]) + 1) * _BLOCK_SIZE, n)
+            rows = slice(self._head + start, self._head + end)
+            sims[start:end] = _cosine_scores(self._emb_matrix[rows], query_vector, self._scales[rows])
+        return sims
+    
+    def _search_index(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        type_code: Optional[int],
+        time_window: Optional[float],
+        current_time: float
+    ) -> Optional[List[Tuple[Memory, float]]]:
+        """
+        使用FAISS倒排索引检索，并对结果按类型和时间窗口后过滤
+        
+        Args:
+            query_vector: 归一化后的查询向量
+            k: 返回结果数量
+            type_code: 筛选记忆类型的编码
+            time_window: 时间窗口（秒）
+            current_time: 当前时间
+            
+        Returns:
+            Optional[List[Tuple[Memory, float]]]: 记忆和相似度得分列表，
+            过滤后不足k个且可能遗漏结果时返回None
+        """
+        n = self._size
+        # 已淘汰的记忆不会从索引中删除，失效条目过多时重建
+        if self.index is None or self.index.ntotal > 2 * n:
+            self._build_index()
+        
+        fetch = min(self.index.ntotal, max(k * 8, 64))
+        scores, ids = self.index.search(query_vector[None, :], fetch)
+        
+        results = []
+        for seq, score in zip(ids[0], scores[0]):
+            if seq < 0:
+                continue
+            if score < self.memory_threshold:
+                # 结果按得分降序排列，之后不会再有满足阈值的记忆
+                return results
+            i = seq - self._seq_head
+            if i < 0:
+                continue
+            row = self._head + i
+            if type_code is not None and self._types_i8[row] != type_code:
+                continue
+            if time_window and self._timestamps[row] < current_time - time_window:
+                continue
+            results.append((self._memory(int(i)), float(score)))
+            if len(results) == k:
+                return results
         
-        return relevant_memories[:k]
+        return results if fetch == self.index.ntotal else None
     
     def save_memories(self, path: str):
         """
         保存记忆到文件
         
+        记忆内容写入JSON文件，嵌入向量按记忆顺序写入同名的 .embeddings.npy 文件。
+        
         Args:
             path: 保存路径
         """
         data = {
             "memory_threshold": self.memory_threshold,
             "max_memories": self.max_memories,
-            "memories": [memory.to_dict() for memory in self.memories]
+            "memories": [
+                {
+                    "content": content,
+                    "timestamp": timestamp,
+                    "type": self._type_names[code],
+                    "metadata": metadata or {}
+                }
+                for content, metadata, timestamp, code in zip(
+                    self._contents,
+                    self._metadatas,
+                    self._timestamps[self._head:self._head + self._size].tolist(),
+                    self._types_i8[self._head:self._head + self._size].tolist()
+                )
+            ]
         }
         
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            with open(path, 'wb') as f:
+                f.write(orjson.dumps(
+                    data,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                ))
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        
+        embeddings_path = self._embeddings_path(path)
+        if self._embeddings:
+            matrix = np.stack([embedding.ravel() for embedding in self._embeddings])
+            # 先写临时文件再替换，已加载的内存映射仍指向旧文件
+            with open(f"{embeddings_path}.tmp", 'wb') as f:
+                np.save(f, matrix)
+            os.replace(f"{embeddings_path}.tmp", embeddings_path)
+        elif Path(embeddings_path).exists():
+            os.remove(embeddings_path)
     
     def load_memories(self, path: str):
         """
@@ -175,12 +664,49 @@ class MemorySystem:
         Args:
             path: 记忆文件路径
         """
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if orjson is not None:
+            with open(path, 'rb') as f:
+                data = orjson.loads(f.read())
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
         
         self.memory_threshold = data["memory_threshold"]
         self.max_memories = data["max_memories"]
-        self.memories = [Memory.from_dict(m) for m in data["memories"]]
+        # 只保留最新的 max_memories 条记忆
+        records = data["memories"][-self.max_memories:]
+        
+        # 嵌入向量作为一块连续矩阵载入，嵌入列只持有其中的行视图；
+        # 新格式内存映射读取 .embeddings.npy，旧格式从JSON中一次性转换
+        embeddings_path = self._embeddings_path(path)
+        if records and "embedding" not in records[0]:
+            if not Path(embeddings_path).exists():
+                raise FileNotFoundError(f"Embedding file {embeddings_path} not found")
+            matrix = np.load(embeddings_path, mmap_mode='r')
+            # 行数与JSON记录数不一致时无法按行对应，避免内容和嵌入向量错位
+            if len(matrix) != len(data["memories"]):
+                raise ValueError(
+                    f"Embedding file {embeddings_path} has {len(matrix)} rows, "
+                    f"expected {len(data['memories'])}"
+                )
+            matrix = matrix[len(matrix) - len(records):]
+        else:
+            matrix = np.asarray([m["embedding"] for m in records], dtype=np.float32)
+        self._contents = deque((m["content"] for m in records), maxlen=self.max_memories)
+        self._embeddings = deque(matrix, maxlen=self.max_memories)
+        self._metadatas = deque((m["metadata"] for m in records), maxlen=self.max_memories)
+        
+        self._reset_rows()
+        self._append_rows(
+            matrix,
+            [m["type"] for m in records],
+            [m["timestamp"] for m in records]
+        )
+    
+    @staticmethod
+    def _embeddings_path(path: str) -> str:
+        """嵌入向量文件路径"""
+        return f"{path}.embeddings.npy"
     
     def clear_memories(self, memory_type: Optional[str] = None):
         """
@@ -190,9 +716,31 @@ class MemorySystem:
             memory_type: 要清除的记忆类型，None表示清除所有
         """
         if memory_type:
-            self.memories = [m for m in self.memories if m.type != memory_type]
-        else:
-            self.memories.clear()
+            code = self._type_codes.get(memory_type)
+            if code is None:
+                return
+            rows = slice(self._head, self._head + self._size)
+            keep = self._types_i8[rows] != code
+            if keep.any():
+                self._contents = deque(compress(self._contents, keep), maxlen=self.max_memories)
+                self._embeddings = deque(compress(self._embeddings, keep), maxlen=self.max_memories)
+                self._metadatas = deque(compress(self._metadatas, keep), maxlen=self.max_memories)
+                
+                # 直接保留已归一化的行，无需重新计算范数
+                self._emb_matrix = self._emb_matrix[rows][keep]
+                self._types_i8 = self._types_i8[rows][keep]
+                self._timestamps = self._timestamps[rows][keep]
+                self._scales = self._scales[rows][keep]
+                self._head = 0
+                self._size = len(self._contents)
+                self.index = None
+                self._seq_head = 0
+                return
+        
+        self._contents.clear()
+        self._embeddings.clear()
+        self._metadatas.clear()
+        self._reset_rows()
     
     def get_memory_stats(self) -> Dict[str, Any]:
         """
@@ -201,19 +749,28 @@ class MemorySystem:
         Returns:
             Dict[str, Any]: 统计信息
         """
-        type_counts = {}
-        for memory in self.memories:
-            type_counts[memory.type] = type_counts.get(memory.type, 0) + 1
+        n = self._size
+        counts = np.bincount(
+            self._types_i8[self._head:self._head + n],
+            minlength=len(self._type_names)
+        )
+        type_counts = {
+            name: int(count)
+            for name, count in zip(self._type_names, counts)
+            if count
+        }
+        
+        timestamps = self._timestamps[self._head:self._head + n]
         
         return {
-            "total_memories": len(self.memories),
+            "total_memories": n,
             "type_distribution": type_counts,
-            "oldest_memory": min(m.timestamp for m in self.memories) if self.memories else None,
-            "newest_memory": max(m.timestamp for m in self.memories) if self.memories else None
+            "oldest_memory": float(timestamps.min()) if n else None,
+            "newest_memory": float(timestamps.max()) if n else None
         }
     
     def __len__(self) -> int:
-        return len(self.memories)
+        return self._size
     
     def __repr__(self) -> str:
         stats = self.get_memory_stats()
@@ -0,0 +1,95 @@
+"""
+测试公共夹具
+----------
+提供不依赖模型下载的嵌入向量管理器。
+"""
+
+import hashlib
+import types
+
+import numpy as np
+import pytest
+
+class FakeEmbeddingManager:
+    """由文本哈希生成确定性向量的嵌入管理器，接口与 EmbeddingManager 一致"""
+
+    def __init__(self, dim: int = 16):
+        self.dim = dim
+        self.model_name = "fake"
+        self.backend_tag = "fake"
+        self.calls = 0
+
+    def _vector(self, text: str) -> np.ndarray:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return np.frombuffer(digest, dtype=np.uint8)[:self.dim].astype(np.float32) - 128
+
+    def get_embedding(self, text: str) -> np.ndarray:
+        self.calls += 1
+        return self._vector(text)
+
+    def batch_get_embeddings(self, texts, batch_size: int = 32, use_lru: bool = False) -> np.ndarray:
+        self.calls += len(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._vector(text) for text in texts])
+
+    def get_embeddings(self, texts, batch_size: int = 32) -> np.ndarray:
+        """scripts/ai_pair_programming_agent.py 中 EmbeddingManager 的批量接口"""
+        return self.batch_get_embeddings(texts, batch_size)
+
+def cosine(a: np.ndarray, b: np.ndarray) -> float:
+    """暴力计算余弦相似度，作为检索结果的参照"""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+@pytest.fixture
+def embedding_manager():
+    """创建测试用的嵌入向量管理器"""
+    return FakeEmbeddingManager()
+
+class StubTokenizer:
+    """按字符编码的分词器，遵守 max_length 截断并按批次填充"""
+
+    def __call__(self, texts, return_tensors="pt", padding=True, truncation=True, max_length=512):
+        import torch
+
+        ids = [[ord(ch) % 97 + 1 for ch in text][:max_length] or [1] for text in texts]
+        width = max(len(row) for row in ids)
+        return {
+            "input_ids": torch.tensor([row + [0] * (width - len(row)) for row in ids]),
+            "attention_mask": torch.tensor([[1] * len(row) + [0] * (width - len(row)) for row in ids]),
+        }
+
+def make_stub_model(dim: int = 8):
+    """创建记录前向计算次数的小模型，输出只依赖各位置的token"""
+    import torch
+
+    class StubModel(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            generator = torch.Generator().manual_seed(0)
+            self.embedding = torch.nn.Embedding(100, dim)
+            self.embedding.weight.data = torch.randn(100, dim, generator=generator)
+            self.forward_texts = 0
+
+        def forward(self, input_ids=None, attention_mask=None, **kwargs):
+            self.forward_texts += len(input_ids)
+            return types.SimpleNamespace(last_hidden_state=self.embedding(input_ids))
+
+    return StubModel()
+
+@pytest.fixture
+def stub_embedding_manager(monkeypatch):
+    """创建使用桩分词器和桩模型的真实 EmbeddingManager，无需下载模型"""
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from src.core import embedding
+
+    monkeypatch.setattr(embedding.AutoTokenizer, "from_pretrained", lambda *args, **kwargs: StubTokenizer())
+    monkeypatch.setattr(embedding.AutoModel, "from_pretrained", lambda *args, **kwargs: make_stub_model())
+
+    def factory(**kwargs):
+        kwargs.setdefault("device", "cpu")
+        return embedding.EmbeddingManager("stub-model", **kwargs)
+    return factory
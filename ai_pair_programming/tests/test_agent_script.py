@@ -0,0 +1,205 @@
+"""
+独立脚本测试
+----------
+测试 scripts/ai_pair_programming_agent.py 中的知识库、向量存储和嵌入向量磁盘缓存。
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from conftest import FakeEmbeddingManager, cosine
+
+SCRIPT_PATH = Path(__file__).resolve().parents[2] / "scripts" / "ai_pair_programming_agent.py"
+
+@pytest.fixture(scope="module")
+def script():
+    """按文件路径加载独立脚本（torch等依赖在脚本中延迟导入，无需安装）"""
+    spec = importlib.util.spec_from_file_location("ai_pair_programming_agent", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_rescan_replaces_changed_file(script, embedding_manager, tmp_path):
+    """测试文件内容变化后重新扫描只保留新版本条目"""
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name in ("a", "b", "c"):
+        (docs / f"{name}.md").write_text(f"# {name}\n旧内容 {name} #tag{name}", encoding="utf-8")
+
+    kb = script.KnowledgeBase(embedding_manager)
+    kb.scan_directory(str(tmp_path))
+    (docs / "a.md").write_text("# a\n新内容 #tagnew", encoding="utf-8")
+    kb.scan_directory(str(tmp_path))
+
+    assert len(kb.knowledge_items) == 3
+    assert len(kb.vector_store._keys) == 3
+    assert kb.categories == {"docs": set(kb.knowledge_items)}
+    assert "taga" not in kb.tags and "tagnew" in kb.tags
+
+    results = kb.query("新内容", k=5, category="docs")
+    assert {item.id for item, _ in results} == set(kb.knowledge_items)
+    assert "新内容" in [item.content for item, _ in results if item.title == "a"][0]
+
+@pytest.mark.parametrize("change", [
+    {"backend_tag": "onnx-int8"},
+    {"model_name": "other"},
+    {"dim": 8},
+])
+def test_file_cache_invalidated_by_model_and_backend(script, tmp_path, change):
+    """测试磁盘缓存只在模型、维度和推理后端都一致时复用"""
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name in ("a", "b"):
+        (docs / f"{name}.md").write_text(f"# {name}\n内容 {name}", encoding="utf-8")
+    cache_dir = str(tmp_path / "cache")
+
+    first = FakeEmbeddingManager()
+    script.KnowledgeBase(first, cache_dir=cache_dir).scan_directory(str(docs))
+    assert first.calls == 2
+
+    same = FakeEmbeddingManager()
+    script.KnowledgeBase(same, cache_dir=cache_dir).scan_directory(str(docs))
+    assert same.calls == 0
+
+    changed = FakeEmbeddingManager(dim=change.get("dim", 16))
+    for name, value in change.items():
+        setattr(changed, name, value)
+    kb = script.KnowledgeBase(changed, cache_dir=cache_dir)
+    kb.scan_directory(str(docs))
+    assert changed.calls == 2
+    assert all(item.embedding.shape == (changed.dim,) for item in kb.knowledge_items.values())
+
+@pytest.fixture(params=["simsimd", "numpy"])
+def vector_store_factory(request, script, monkeypatch):
+    """分别测试SimSIMD内核和NumPy回退路径"""
+    if request.param == "simsimd":
+        if script.simsimd is None:
+            pytest.skip("simsimd is not installed")
+    else:
+        monkeypatch.setattr(script, "simsimd", None)
+    return script.SimpleVectorStore
+
+def make_vectors(n=60, dim=32):
+    """生成随机测试向量，范数各不相同"""
+    rng = np.random.default_rng(0)
+    return {f"key{i}": rng.normal(size=dim).astype(np.float32) * (i + 1) for i in range(n)}
+
+def brute_force(vectors, query, k, allowed=None):
+    """float32暴力计算余弦相似度并排序，作为参照结果"""
+    scored = [
+        (key, cosine(vector, query))
+        for key, vector in vectors.items()
+        if allowed is None or key in allowed
+    ]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:k]
+
+@pytest.mark.parametrize("quantize", [False, True])
+@pytest.mark.parametrize("k", [1, 5, 100])
+def test_vector_store_search_matches_brute_force(vector_store_factory, quantize, k):
+    """测试检索结果与float32暴力计算一致，量化存储时得分误差在容许范围内"""
+    vectors = make_vectors()
+    store = vector_store_factory(quantize=quantize)
+    for key, vector in vectors.items():
+        store.add_vector(key, vector)
+    query = np.random.default_rng(1).normal(size=32).astype(np.float32)
+
+    results = store.search(query, k)
+    expected = brute_force(vectors, query, k)
+    assert len(results) == len(expected)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+    if quantize:
+        exact = dict(brute_force(vectors, query, len(vectors)))
+        assert all(abs(score - exact[key]) < 0.02 for key, score in results)
+        # 近似得分只可能交换得分相近的结果
+        assert exact[results[-1][0]] >= expected[-1][1] - 0.04
+    else:
+        assert [key for key, _ in results] == [key for key, _ in expected]
+        assert np.allclose(scores, [score for _, score in expected], atol=1e-5)
+
+def test_vector_store_allowed_filter(vector_store_factory):
+    """测试 allowed 预筛选只在候选键中检索，并忽略未知的键"""
+    vectors = make_vectors()
+    store = vector_store_factory()
+    for key, vector in vectors.items():
+        store.add_vector(key, vector)
+    query = vectors["key3"]
+    allowed = {f"key{i}" for i in range(0, 60, 7)} | {"missing"}
+
+    results = store.search(query, 4, allowed)
+    expected = brute_force(vectors, query, 4, allowed)
+    assert [key for key, _ in results] == [key for key, _ in expected]
+    assert store.search(query, 4, {"missing"}) == []
+    assert store.search(query, 0) == []
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_vector_store_get_vector_round_trip(script, quantize):
+    """测试 get_vector 还原原始向量（量化存储时先反量化），重复键原地更新"""
+    vectors = make_vectors(n=70)
+    store = script.SimpleVectorStore(quantize=quantize)
+    for key, vector in vectors.items():
+        store.add_vector(key, vector)
+    store.add_vector("key5", vectors["key6"])
+    vectors["key5"] = vectors["key6"]
+
+    assert len(store._keys) == 70
+    for key, vector in vectors.items():
+        restored = store.get_vector(key)
+        tolerance = 0.01 * np.abs(vector).max() if quantize else 1e-5 * np.abs(vector).max()
+        assert np.allclose(restored, vector, atol=tolerance)
+    assert store.get_vector("missing") is None
+
+def test_file_cache_grows_and_reopens(script, tmp_path):
+    """测试映射文件超出初始容量后扩展，刷新后重新打开仍能读取全部向量"""
+    rng = np.random.default_rng(0)
+    vectors = {f"/src/file{i}.py": rng.normal(size=16).astype(np.float32) for i in range(150)}
+
+    cache = script.EmbeddingFileCache(str(tmp_path), "fake", 16, "fake")
+    for path, vector in vectors.items():
+        cache.put(path, f"hash-{path}", vector)
+    assert cache.rows == 150
+    assert cache._matrix.shape[0] >= 150
+    assert cache.get("/src/file0.py", "hash-/src/file0.py") is not None
+
+    # 已缓存的文件复用原来的行，内容变化后旧哈希不再命中
+    cache.put("/src/file7.py", "new-hash", vectors["/src/file8.py"])
+    vectors["/src/file7.py"] = vectors["/src/file8.py"]
+    assert cache.rows == 150
+    assert cache.get("/src/file7.py", "hash-/src/file7.py") is None
+    cache.flush()
+
+    reopened = script.EmbeddingFileCache(str(tmp_path), "fake", 16, "fake")
+    assert reopened.rows == 150
+    for path, vector in vectors.items():
+        content_hash = "new-hash" if path == "/src/file7.py" else f"hash-{path}"
+        # 磁盘上以float16保存
+        assert np.allclose(reopened.get(path, content_hash), vector, atol=1e-2, rtol=1e-3)
+    assert reopened.get("/src/missing.py", "hash") is None
+
+    # 重新打开后继续追加新文件
+    reopened.put("/src/extra.py", "extra", vectors["/src/file1.py"])
+    reopened.flush()
+    again = script.EmbeddingFileCache(str(tmp_path), "fake", 16, "fake")
+    assert again.rows == 151
+    assert np.allclose(again.get("/src/extra.py", "extra"), vectors["/src/file1.py"], atol=1e-2, rtol=1e-3)
+
+def test_file_cache_put_rejects_wrong_dimension(script, tmp_path):
+    """测试写入维度与缓存不一致的向量时报错"""
+    cache = script.EmbeddingFileCache(str(tmp_path), "fake", 16, "fake")
+    with pytest.raises(ValueError):
+        cache.put("/src/a.py", "hash", np.zeros(8, dtype=np.float32))
+
+def test_file_id_matches_package(script, embedding_manager, tmp_path):
+    """测试脚本与 src.core.knowledge 对同一文件生成相同的ID（路径和内容之间有分隔符）"""
+    from src.core.knowledge import KnowledgeBase
+
+    path = tmp_path / "a.md"
+    path.write_text("# 标题\n内容", encoding="utf-8")
+
+    item = script.KnowledgeBase(embedding_manager)._read_file(path)
+    assert item.id == KnowledgeBase(embedding_manager)._load_file(path).id
@@ -0,0 +1,131 @@
+"""
+嵌入向量管理器测试
+--------------
+使用桩分词器和桩模型测试磁盘缓存、内存LRU缓存和批量编码。
+"""
+
+import numpy as np
+import pytest
+
+from src.core.embedding import EmbeddingCache
+
+def forward_texts(manager):
+    """桩模型累计编码的文本数"""
+    return manager.backend.model.forward_texts
+
+def test_embedding_cache_hit_and_miss(stub_embedding_manager, tmp_path):
+    """测试磁盘缓存命中时不运行模型，重新打开后仍可命中"""
+    cache_path = str(tmp_path / "embeddings.db")
+    manager = stub_embedding_manager(cache_path=cache_path, lru_size=0)
+
+    first = manager.get_embedding("缓存测试")
+    assert forward_texts(manager) == 1
+    assert np.array_equal(manager.get_embedding("缓存测试"), first)
+    assert forward_texts(manager) == 1
+
+    manager.get_embedding("另一段文本")
+    assert forward_texts(manager) == 2
+
+    # 批量接口与单条接口共用缓存，重复文本只计算一次
+    batch = manager.batch_get_embeddings(["缓存测试", "新文本", "新文本"])
+    assert forward_texts(manager) == 3
+    assert np.array_equal(batch[0], first)
+    assert np.array_equal(batch[1], batch[2])
+
+    reopened = stub_embedding_manager(cache_path=cache_path, lru_size=0)
+    assert np.array_equal(reopened.get_embedding("缓存测试"), first)
+    assert forward_texts(reopened) == 0
+
+@pytest.mark.parametrize("attribute, value", [
+    ("model_name", "other-model"),
+    ("backend_name", "onnx"),
+    ("pooling_strategy", "cls"),
+    ("max_length", 2),
+])
+def test_embedding_cache_key_invalidation(stub_embedding_manager, tmp_path, attribute, value):
+    """测试模型、推理后端、池化策略或截断长度变化后不复用旧向量"""
+    cache_path = str(tmp_path / "embeddings.db")
+    manager = stub_embedding_manager(cache_path=cache_path, lru_size=0)
+    before = manager.get_embedding("缓存失效测试")
+
+    setattr(manager, attribute, value)
+    after = manager.get_embedding("缓存失效测试")
+    assert forward_texts(manager) == 2
+    if attribute in ("pooling_strategy", "max_length"):
+        assert not np.allclose(after, before)
+
+def test_embedding_cache_round_trip(tmp_path):
+    """测试SQLite缓存按键读写float32向量"""
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"))
+    vector = np.arange(4, dtype=np.float64)
+    cache.set_many([(b"key", vector)])
+
+    assert cache.get(b"missing") is None
+    stored = cache.get(b"key")
+    assert stored.dtype == np.float32
+    assert np.array_equal(stored, vector)
+    cache.close()
+
+def test_lru_evicts_least_recently_used(stub_embedding_manager):
+    """测试内存LRU缓存超出容量时淘汰最久未使用的条目"""
+    manager = stub_embedding_manager(lru_size=2)
+    manager.get_embedding("一")
+    manager.get_embedding("二")
+    manager.get_embedding("一")  # "一" 变为最近使用
+    manager.get_embedding("三")  # 淘汰 "二"
+    assert forward_texts(manager) == 3
+
+    assert [key[-1] for key in manager._lru] == ["一", "三"]
+    manager.get_embedding("一")
+    assert forward_texts(manager) == 3
+    manager.get_embedding("二")
+    assert forward_texts(manager) == 4
+
+def test_lru_arrays_are_read_only(stub_embedding_manager):
+    """测试缓存返回的数组为只读，调用方无法修改共享的向量"""
+    manager = stub_embedding_manager(lru_size=8)
+    embedding = manager.get_embedding("只读")
+    assert manager.get_embedding("只读") is embedding
+    with pytest.raises(ValueError):
+        embedding[0] = 1.0
+
+    manager.batch_get_embeddings(["批量只读"], use_lru=True)
+    with pytest.raises(ValueError):
+        manager.get_embedding("批量只读")[0] = 1.0
+
+def test_lru_keys_separate_pooling_strategies(stub_embedding_manager):
+    """测试池化策略不同的向量不共用LRU条目"""
+    manager = stub_embedding_manager(lru_size=8)
+    mean = manager.get_embedding("池化")
+    manager.pooling_strategy = "max"
+    pooled_max = manager.get_embedding("池化")
+
+    assert forward_texts(manager) == 2
+    assert not np.allclose(mean, pooled_max)
+    manager.pooling_strategy = "mean"
+    assert manager.get_embedding("池化") is mean
+
+def test_batch_lru_is_opt_in(stub_embedding_manager):
+    """测试批量接口只在 use_lru=True 时读写LRU缓存"""
+    manager = stub_embedding_manager(lru_size=8)
+    manager.batch_get_embeddings(["甲", "乙"])
+    assert len(manager._lru) == 0
+
+    batch = manager.batch_get_embeddings(["甲", "乙"], use_lru=True)
+    assert len(manager._lru) == 2
+    assert forward_texts(manager) == 4
+    again = manager.batch_get_embeddings(["乙", "甲"], use_lru=True)
+    assert forward_texts(manager) == 4
+    assert np.array_equal(again, batch[::-1])
+
+def test_batch_preserves_input_order(stub_embedding_manager):
+    """测试按长度排序分批计算后，结果按输入顺序返回且与逐条计算一致"""
+    manager = stub_embedding_manager(lru_size=0)
+    texts = ["很长很长的一段文本内容", "短", "中等长度文本", "", "另一段较长的文本", "二字", "短"]
+
+    batch = manager.batch_get_embeddings(texts, batch_size=3)
+    single = np.stack([manager.get_embedding(text) for text in texts])
+
+    assert batch.shape == (len(texts), 8)
+    assert np.allclose(batch, single, atol=1e-6)
+    assert np.array_equal(batch[1], batch[6])
@@ -0,0 +1,170 @@
+"""
+知识库测试
+--------
+测试嵌入矩阵检索、筛选和持久化。
+"""
+
+import numpy as np
+import pytest
+
+from src.core.knowledge import KnowledgeBase, KnowledgeItem
+from conftest import cosine
+
+def make_item(item_id, category="general", tags=None):
+    """创建测试用的知识条目"""
+    return KnowledgeItem(
+        id=item_id,
+        title=f"标题 {item_id}",
+        content=f"内容 {item_id}",
+        category=category,
+        tags=tags or []
+    )
+
+@pytest.fixture
+def knowledge_base(embedding_manager):
+    """创建包含若干条目的知识库"""
+    kb = KnowledgeBase(embedding_manager)
+    kb.add_items([
+        make_item(f"item{i}", category="core" if i % 2 else "docs", tags=[f"t{i % 3}"])
+        for i in range(40)
+    ])
+    return kb
+
+def brute_force(kb, query, k, threshold, ids=None):
+    """对全部条目计算余弦相似度并排序，作为参照结果"""
+    query_vector = kb.embedding_manager.get_embedding(query)
+    scored = [
+        (item_id, cosine(item.embedding, query_vector))
+        for item_id, item in kb.knowledge_items.items()
+        if ids is None or item_id in ids
+    ]
+    scored = [(item_id, score) for item_id, score in scored if score >= threshold]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:k]
+
+def test_id_index_bookkeeping(knowledge_base):
+    """测试重复ID更新原有行而不是追加"""
+    assert len(knowledge_base) == 40
+    knowledge_base.add_item(make_item("item3", category="core", tags=["t0"]))
+
+    assert len(knowledge_base._id_order) == 40
+    for row, item_id in enumerate(knowledge_base._id_order):
+        assert knowledge_base._id_index[item_id] == row
+        assert np.array_equal(
+            knowledge_base._emb_matrix[row],
+            knowledge_base.knowledge_items[item_id].embedding
+        )
+
+def test_embeddings_normalized_float16(knowledge_base):
+    """测试嵌入向量以归一化的float16保存"""
+    for item in knowledge_base.knowledge_items.values():
+        assert item.embedding.dtype == np.float16
+        assert np.linalg.norm(item.embedding.astype(np.float32)) == pytest.approx(1.0, abs=1e-2)
+
+@pytest.mark.parametrize("k", [1, 5, 100])
+def test_query_matches_brute_force(knowledge_base, k):
+    """测试检索顺序与暴力计算一致"""
+    got = knowledge_base.query("内容 item7", k=k, threshold=-1.0)
+    expected = brute_force(knowledge_base, "内容 item7", k, -1.0)
+
+    assert [item.id for item, _ in got] == [item_id for item_id, _ in expected]
+    assert np.allclose([score for _, score in got], [score for _, score in expected], atol=1e-3)
+
+def test_query_threshold(knowledge_base):
+    """测试低于阈值的结果被过滤"""
+    results = knowledge_base.query("内容 item7", k=40, threshold=0.2)
+    assert all(score >= 0.2 for _, score in results)
+    assert len(results) == len(brute_force(knowledge_base, "内容 item7", 40, 0.2))
+
+def test_query_category_and_tags(knowledge_base):
+    """测试分类和标签通过集合运算筛选候选项"""
+    expected_ids = {
+        item_id for item_id, item in knowledge_base.knowledge_items.items()
+        if item.category == "core" and set(item.tags) & {"t0", "t1"}
+    }
+    results = knowledge_base.query("内容 item7", k=40, category="core", tags=["t0", "t1"], threshold=-1.0)
+
+    assert {item.id for item, _ in results} == expected_ids
+    expected = brute_force(knowledge_base, "内容 item7", 40, -1.0, expected_ids)
+    assert [item.id for item, _ in results] == [item_id for item_id, _ in expected]
+
+    assert knowledge_base.query("内容", category="missing") == []
+
+def test_query_empty(embedding_manager):
+    """测试空知识库返回空结果"""
+    assert KnowledgeBase(embedding_manager).query("任意内容") == []
+
+def test_save_load_round_trip(knowledge_base, tmp_path, embedding_manager):
+    """测试嵌入向量通过 .embeddings.npy 保存和加载"""
+    path = tmp_path / "kb.json"
+    knowledge_base.save_knowledge_base(str(path))
+    assert (tmp_path / "kb.json.embeddings.npy").exists()
+
+    loaded = KnowledgeBase(embedding_manager)
+    calls = embedding_manager.calls
+    loaded.load_knowledge_base(str(path))
+
+    # 向量全部来自 .npy 文件，无需重新计算
+    assert embedding_manager.calls == calls
+    assert loaded._id_order == knowledge_base._id_order
+    for item_id, item in knowledge_base.knowledge_items.items():
+        assert np.array_equal(loaded.knowledge_items[item_id].embedding, item.embedding)
+    assert loaded.categories == knowledge_base.categories
+    assert loaded.tags == knowledge_base.tags
+
+    query = "内容 item11"
+    assert [item.id for item, _ in loaded.query(query, k=5, threshold=-1.0)] == \
+        [item.id for item, _ in knowledge_base.query(query, k=5, threshold=-1.0)]
+
+def test_rescan_replaces_changed_file(embedding_manager, tmp_path):
+    """测试文件内容变化后重新扫描只保留新版本条目"""
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.md").write_text("# 旧标题\n旧内容", encoding="utf-8")
+    (docs / "b.md").write_text("# 其他\n其他内容", encoding="utf-8")
+
+    kb = KnowledgeBase(embedding_manager)
+    kb.scan_directory(str(tmp_path))
+    assert len(kb) == 2
+    old_ids = set(kb.knowledge_items)
+
+    # 内容未变化时不重新计算嵌入向量
+    calls = embedding_manager.calls
+    kb.scan_directory(str(tmp_path))
+    assert embedding_manager.calls == calls
+
+    (docs / "a.md").write_text("# 新标题\n新内容", encoding="utf-8")
+    kb.scan_directory(str(tmp_path))
+
+    assert len(kb) == 2
+    assert {item.title for item in kb.knowledge_items.values()} == {"新标题", "其他"}
+    new_id = (set(kb.knowledge_items) - old_ids).pop()
+    assert kb.knowledge_items[new_id].metadata["content_hash"] == new_id
+    assert sorted(kb._id_order) == sorted(kb.knowledge_items)
+    assert kb.categories == {"docs": set(kb.knowledge_items)}
+
+    results = kb.query("任意", k=5, threshold=-1.0)
+    assert {item.id for item, _ in results} == set(kb.knowledge_items)
+
+def test_load_rejects_mismatched_sidecar(knowledge_base, tmp_path, embedding_manager):
+    """测试 .embeddings.npy 行数与条目数不一致时拒绝加载"""
+    path = tmp_path / "kb.json"
+    knowledge_base.save_knowledge_base(str(path))
+
+    sidecar = tmp_path / "kb.json.embeddings.npy"
+    np.save(sidecar, np.load(sidecar)[1:])
+
+    with pytest.raises(ValueError):
+        KnowledgeBase(embedding_manager).load_knowledge_base(str(path))
+
+def test_save_empty_removes_sidecar(knowledge_base, tmp_path, embedding_manager):
+    """测试保存空知识库时删除旧的 .embeddings.npy"""
+    path = tmp_path / "kb.json"
+    knowledge_base.save_knowledge_base(str(path))
+
+    KnowledgeBase(embedding_manager).save_knowledge_base(str(path))
+    assert not (tmp_path / "kb.json.embeddings.npy").exists()
+
+    loaded = KnowledgeBase(embedding_manager)
+    loaded.load_knowledge_base(str(path))
+    assert len(loaded) == 0
@@ -0,0 +1,216 @@
+"""
+记忆系统测试
+--------
+测试列式存储的记忆系统的淘汰、清除、检索和持久化。
+"""
+
+import numpy as np
+import pytest
+
+from src.core.memory import MemorySystem
+from conftest import cosine
+
+@pytest.fixture
+def memory_system(embedding_manager):
+    """创建包含若干条记忆的记忆系统"""
+    ms = MemorySystem(embedding_manager, memory_threshold=-1.0, max_memories=50)
+    ms.add_memories_batch(
+        [f"记忆 {i}" for i in range(30)],
+        ["code" if i % 3 == 0 else "conversation" for i in range(30)]
+    )
+    return ms
+
+def brute_force(ms, query, k, memory_type=None):
+    """对全部记忆计算余弦相似度并排序，作为参照结果"""
+    query_vector = ms.embedding_manager.get_embedding(query)
+    scored = [
+        (memory.content, cosine(memory.embedding, query_vector))
+        for memory in ms.memories
+        if memory_type is None or memory.type == memory_type
+    ]
+    scored = [(content, score) for content, score in scored if score >= ms.memory_threshold]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:k]
+
+def assert_columns_aligned(ms):
+    """检查各列与嵌入矩阵按行对应"""
+    memories = ms.memories
+    assert len(memories) == len(ms) == len(ms._contents) == len(ms._embeddings)
+    for i, memory in enumerate(memories):
+        vector = ms._dense_rows(slice(ms._head + i, ms._head + i + 1))[0]
+        expected = memory.embedding / np.linalg.norm(memory.embedding)
+        assert np.allclose(vector, expected, atol=1e-2 if ms.quantize_embeddings else 1e-5)
+        assert ms._memory(i).content == memory.content
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_eviction_keeps_newest(embedding_manager, quantize):
+    """测试超过 max_memories 后淘汰最旧的记忆"""
+    ms = MemorySystem(embedding_manager, memory_threshold=-1.0, max_memories=20,
+                      quantize_embeddings=quantize)
+    for i in range(15):
+        ms.add_memory(f"记忆 {i}", "conversation")
+    ms.add_memories_batch([f"记忆 {i}" for i in range(15, 60)], ["code"] * 45)
+    ms.add_memory("记忆 60", "prompt")
+
+    assert len(ms) == 20
+    assert [memory.content for memory in ms.memories] == [f"记忆 {i}" for i in range(41, 61)]
+    assert_columns_aligned(ms)
+    assert ms.get_memory_stats()["type_distribution"] == {"code": 19, "prompt": 1}
+
+    results = ms.retrieve_relevant_memories("记忆 3", k=5)
+    assert [(m.content, pytest.approx(s, abs=1e-2)) for m, s in results] == \
+        [(c, pytest.approx(s, abs=1e-2)) for c, s in brute_force(ms, "记忆 3", 5)]
+
+def test_clear_memories_by_type(memory_system):
+    """测试按类型清除后剩余记忆紧凑存储且仍可检索和追加"""
+    memory_system.clear_memories("code")
+
+    assert [memory.content for memory in memory_system.memories] == \
+        [f"记忆 {i}" for i in range(30) if i % 3 != 0]
+    assert memory_system._head == 0
+    assert_columns_aligned(memory_system)
+    assert memory_system.retrieve_relevant_memories("记忆 3", memory_type="code") == []
+
+    memory_system.add_memory("新记忆", "code")
+    assert memory_system.memories[-1].content == "新记忆"
+    assert_columns_aligned(memory_system)
+
+    memory_system.clear_memories("missing")
+    assert len(memory_system) == 21
+
+    memory_system.clear_memories()
+    assert len(memory_system) == 0
+    assert memory_system.retrieve_relevant_memories("记忆 3") == []
+
+@pytest.mark.parametrize("memory_type", [None, "code", "conversation"])
+@pytest.mark.parametrize("k", [1, 4, 100])
+def test_retrieval_matches_brute_force(memory_system, memory_type, k):
+    """测试检索顺序与暴力计算一致"""
+    results = memory_system.retrieve_relevant_memories("记忆 7", k=k, memory_type=memory_type)
+    expected = brute_force(memory_system, "记忆 7", k, memory_type)
+
+    assert [memory.content for memory, _ in results] == [content for content, _ in expected]
+    assert np.allclose([score for _, score in results], [score for _, score in expected], atol=1e-5)
+
+def test_retrieval_threshold_and_time_window(memory_system):
+    """测试相似度阈值和时间窗口筛选"""
+    memory_system.memory_threshold = 0.2
+    results = memory_system.retrieve_relevant_memories("记忆 7", k=30)
+    assert all(score >= 0.2 for _, score in results)
+    assert len(results) == len(brute_force(memory_system, "记忆 7", 30))
+
+    memory_system._timestamps[memory_system._head:memory_system._head + 10] -= 3600
+    recent = memory_system.retrieve_relevant_memories("记忆 7", k=30, time_window=60)
+    assert {memory.content for memory, _ in recent} == \
+        {memory.content for memory, _ in results} - {f"记忆 {i}" for i in range(10)}
+
+def test_memory_stats(memory_system):
+    """测试统计信息"""
+    stats = memory_system.get_memory_stats()
+    assert stats["total_memories"] == 30
+    assert stats["type_distribution"] == {"code": 10, "conversation": 20}
+    assert stats["oldest_memory"] <= stats["newest_memory"]
+
+    empty = MemorySystem(memory_system.embedding_manager).get_memory_stats()
+    assert empty == {
+        "total_memories": 0,
+        "type_distribution": {},
+        "oldest_memory": None,
+        "newest_memory": None
+    }
+
+def test_save_load_round_trip(memory_system, tmp_path, embedding_manager):
+    """测试记忆通过JSON和 .embeddings.npy 保存和加载"""
+    memory_system.add_memory("带元数据", "prompt", metadata={"file": "a.py"})
+    path = tmp_path / "memories.json"
+    memory_system.save_memories(str(path))
+    assert (tmp_path / "memories.json.embeddings.npy").exists()
+
+    loaded = MemorySystem(embedding_manager)
+    calls = embedding_manager.calls
+    loaded.load_memories(str(path))
+
+    # 向量全部来自 .npy 文件，无需重新计算
+    assert embedding_manager.calls == calls
+    assert loaded.max_memories == 50
+    assert len(loaded) == 31
+    for original, restored in zip(memory_system.memories, loaded.memories):
+        assert restored.content == original.content
+        assert restored.type == original.type
+        assert restored.timestamp == original.timestamp
+        assert (restored.metadata or {}) == (original.metadata or {})
+        assert np.array_equal(restored.embedding, original.embedding)
+    assert_columns_aligned(loaded)
+    assert loaded.get_memory_stats() == memory_system.get_memory_stats()
+
+    query = "记忆 5"
+    assert [m.content for m, _ in loaded.retrieve_relevant_memories(query, k=5)] == \
+        [m.content for m, _ in memory_system.retrieve_relevant_memories(query, k=5)]
+
+def test_load_keeps_newest_when_max_memories_shrinks(memory_system, tmp_path, embedding_manager):
+    """测试保存的记录多于 max_memories 时只载入最新的记忆"""
+    memory_system.max_memories = 10
+    path = tmp_path / "memories.json"
+    memory_system.save_memories(str(path))
+
+    loaded = MemorySystem(embedding_manager)
+    loaded.load_memories(str(path))
+    assert [memory.content for memory in loaded.memories] == [f"记忆 {i}" for i in range(20, 30)]
+    assert_columns_aligned(loaded)
+
+def test_load_rejects_mismatched_sidecar(memory_system, tmp_path, embedding_manager):
+    """测试 .embeddings.npy 行数与记录数不一致时拒绝加载"""
+    path = tmp_path / "memories.json"
+    memory_system.save_memories(str(path))
+
+    sidecar = tmp_path / "memories.json.embeddings.npy"
+    np.save(sidecar, np.load(sidecar)[:-3])
+
+    with pytest.raises(ValueError):
+        MemorySystem(embedding_manager).load_memories(str(path))
+
+def test_load_requires_sidecar(memory_system, tmp_path, embedding_manager):
+    """测试新格式的 .embeddings.npy 缺失时给出明确的错误"""
+    path = tmp_path / "memories.json"
+    memory_system.save_memories(str(path))
+    (tmp_path / "memories.json.embeddings.npy").unlink()
+
+    with pytest.raises(FileNotFoundError, match="embeddings.npy"):
+        MemorySystem(embedding_manager).load_memories(str(path))
+
+def test_ivf_index_matches_exact_scan(embedding_manager, monkeypatch):
+    """测试倒排索引检索与线性扫描一致，并跳过已淘汰的序号"""
+    pytest.importorskip("faiss")
+    indexed = MemorySystem(embedding_manager, memory_threshold=-1.0, max_memories=300,
+                           faiss_threshold=50)
+    exact = MemorySystem(embedding_manager, memory_threshold=-1.0, max_memories=300)
+    for ms in (indexed, exact):
+        ms.add_memories_batch(
+            [f"记忆 {i}" for i in range(200)],
+            ["code" if i % 10 == 0 else "conversation" for i in range(200)]
+        )
+
+    def compare(query, k, memory_type=None):
+        got = indexed.retrieve_relevant_memories(query, k=k, memory_type=memory_type)
+        expected = exact.retrieve_relevant_memories(query, k=k, memory_type=memory_type)
+        assert [m.content for m, _ in got] == [m.content for m, _ in expected]
+        assert np.allclose([s for _, s in got], [s for _, s in expected], atol=1e-5)
+
+    compare("记忆 1", 5)
+    assert indexed.index is not None and indexed.index.ntotal == 200
+
+    # 淘汰最旧的100条后索引中仍保留其序号，检索时必须跳过
+    for ms in (indexed, exact):
+        ms.add_memories_batch([f"新记忆 {i}" for i in range(200)], ["conversation"] * 200)
+    assert indexed.index.ntotal == 400 and indexed._seq_head == 100
+    for query in ("记忆 1", "记忆 150", "新记忆 7"):
+        compare(query, 10)
+        compare(query, 10, memory_type="conversation")
+
+    # 按类型过滤后不足k个时退回线性扫描
+    block_scores = []
+    original = indexed._block_scores
+    monkeypatch.setattr(indexed, "_block_scores",
+                        lambda *args: block_scores.append(1) or original(*args))
+    compare("记忆 1", 20, memory_type="code")
+    assert block_scores
@@ -1,28 +1,39 @@
+from contextlib import asynccontextmanager
+from functools import cache
+from typing import List
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import models
-from database import engine
-from routes import router
+from . import models
+from .database import engine
+from .routes import router
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+# 环境变量已在导入 database 时通过 load_dotenv() 加载，这里不再重复查找 .env 文件
 
-app = FastAPI()
+@cache
+def get_cors_origins() -> List[str]:
+    """解析 CORS_ORIGINS，去掉空白项和结尾的斜杠，结果在进程内缓存"""
+    origins = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
+    return [origin.strip().rstrip("/") for origin in origins if origin.strip()]
 
-# 配置 CORS
-origins = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 创建数据库表：在每个工作进程启动时执行，而不是在导入模块时
+    models.Base.metadata.create_all(bind=engine)
+    yield
+
+# 默认使用 orjson 序列化响应，比标准库 json 更快
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
+# 配置 CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,
+    allow_origins=get_cors_origins(),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# 创建数据库表
-models.Base.metadata.create_all(bind=engine)
-
 # 包含路由
 app.include_router(router)
@@ -0,0 +1,79 @@
+from contextlib import asynccontextmanager
+
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.main import app
+from src.database import Base, get_db
+from src import models  # 注册全部模型，create_all 才能建出完整的表结构
+
+@asynccontextmanager
+async def _test_lifespan(app):
+    """测试用的 lifespan：不执行任何启动操作"""
+    yield
+
+@pytest.fixture(scope="session")
+def engine():
+    """整个测试会话共用一个数据库引擎，表结构只创建一次"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+
+    # pysqlite 默认的事务处理不支持 SAVEPOINT，改为由 SQLAlchemy 显式发出 BEGIN
+    @event.listens_for(engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def do_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+@pytest.fixture(scope="function")
+def connection(engine):
+    """每个测试在一个外层事务中运行，结束后回滚"""
+    connection = engine.connect()
+    transaction = connection.begin()
+    yield connection
+    transaction.rollback()
+    connection.close()
+
+@pytest.fixture(scope="function")
+def session_factory(connection):
+    """会话的提交只释放 SAVEPOINT，数据随外层事务一起回滚"""
+    return sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=connection,
+        join_transaction_mode="create_savepoint"
+    )
+
+@pytest.fixture(scope="function")
+def override_get_db(session_factory):
+    """为每个测试创建一个新的数据库会话"""
+    def _override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+    return _override_get_db
+
+@pytest.fixture(scope="function")
+def client(override_get_db, monkeypatch):
+    """为每个测试创建一个新的测试客户端"""
+    # 表结构已在测试引擎上创建，替换应用的 lifespan，启动时不再对真实数据库执行 create_all
+    monkeypatch.setattr(app.router, "lifespan_context", _test_lifespan)
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
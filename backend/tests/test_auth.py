@@ -1,49 +1,5 @@
-from fastapi.testclient import TestClient
-import pytest
-from sqlalchemy import create_engine, event
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-
-from src.main import app
-from src.database import Base, get_db
 from src import models, auth
 
-@pytest.fixture(scope="function")
-def engine():
-    """为每个测试创建一个新的数据库引擎"""
-    engine = create_engine(
-        "sqlite://",
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool
-    )
-    return engine
-
-@pytest.fixture(scope="function")
-def session_factory(engine):
-    """为每个测试创建一个新的会话工厂"""
-    Base.metadata.create_all(bind=engine)
-    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base.metadata.drop_all(bind=engine)
-
-@pytest.fixture(scope="function")
-def override_get_db(session_factory):
-    """为每个测试创建一个新的数据库会话"""
-    def _override_get_db():
-        session = session_factory()
-        try:
-            yield session
-        finally:
-            session.close()
-    return _override_get_db
-
-@pytest.fixture(scope="function")
-def client(override_get_db):
-    """为每个测试创建一个新的测试客户端"""
-    app.dependency_overrides[get_db] = override_get_db
-    with TestClient(app) as test_client:
-        yield test_client
-    app.dependency_overrides.clear()
-
 def test_register_user(client):
     """测试用户注册"""
     response = client.post(
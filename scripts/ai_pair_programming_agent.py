@@ -10,28 +10,80 @@ AI Pair Programming Agent
 """
 
 import os
+import io
 import json
-from typing import Dict, List, Optional, Tuple, Any, Protocol
+from typing import Dict, List, Optional, Set, Tuple, Any, Protocol
 from dataclasses import dataclass
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-import torch
-from transformers import AutoTokenizer, AutoModel
 import time
-import yaml
 from pathlib import Path
 import hashlib
 import re
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from abc import ABC, abstractmethod
 
+try:
+    import simsimd
+except ImportError:  # simsimd为可选依赖，未安装时使用NumPy计算
+    simsimd = None
+
+try:
+    import numba
+except ImportError:  # numba为可选依赖，未安装时使用NumPy计算
+    numba = None
+
+# ============= 相似度计算 =============
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _cos_scores(matrix, query, query_norm_sq):
+        """并行计算矩阵各行与查询向量的余弦相似度"""
+        out = np.empty(matrix.shape[0], dtype=np.float32)
+        for i in numba.prange(matrix.shape[0]):
+            dot = 0.0
+            norm_sq = 0.0
+            for j in range(matrix.shape[1]):
+                value = float(matrix[i, j])
+                dot += value * query[j]
+                norm_sq += value * value
+            denom = np.sqrt(norm_sq * query_norm_sq)
+            out[i] = dot / denom if denom > 0 else 0.0
+        return out
+
+def _cosine_scores(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """批量计算查询向量与矩阵各行的余弦相似度：依次尝试SimSIMD、Numba、NumPy"""
+    if simsimd is not None and matrix.dtype == query.dtype:
+        return 1.0 - np.asarray(simsimd.cdist(query[None, :], matrix, metric="cosine"))[0]
+    
+    query = query.astype(np.float32, copy=False)
+    query_norm_sq = float(np.vdot(query, query))
+    if numba is not None:
+        return _cos_scores(matrix, query, query_norm_sq)
+    
+    matrix = matrix.astype(np.float32, copy=False)
+    denom = np.sqrt(np.einsum("ij,ij->i", matrix, matrix) * query_norm_sq)
+    dots = matrix @ query
+    return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+def _quantize_int8(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+    """按最大绝对值把向量量化为int8，返回量化结果和缩放系数"""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+    scale = 127.0 / peak if peak > 0 else 1.0
+    return np.round(vector * scale).astype(np.int8), scale
+
 # ============= 核心接口定义 =============
 
 class VectorStore(Protocol):
     """向量存储接口"""
     def add_vector(self, key: str, vector: np.ndarray) -> None: ...
-    def search(self, query_vector: np.ndarray, k: int) -> List[Tuple[str, float]]: ...
+    def search(self, query_vector: np.ndarray, k: int,
+               allowed: Optional[Set[str]] = None) -> List[Tuple[str, float]]: ...
     def get_vector(self, key: str) -> Optional[np.ndarray]: ...
+    def remove_vector(self, key: str) -> None: ...
 
 class ContentProcessor(Protocol):
     """内容处理器接口"""
@@ -73,54 +125,327 @@ class PromptTemplate:
 
 class SimpleVectorStore(VectorStore):
     """简单的向量存储实现"""
-    def __init__(self):
-        self.vectors: Dict[str, np.ndarray] = {}
+    def __init__(self, quantize: bool = False):
+        # 启用量化时以int8保存归一化向量，否则以float32保存
+        self.quantize = quantize
+        # 归一化后的向量按行存入预分配矩阵，容量不足时按倍数扩容；
+        # 原始范数和量化缩放系数按行单独保存，用于还原向量
+        self._keys: List[str] = []
+        self._key_index: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._norms = np.empty(0, dtype=np.float32)
+        self._scales = np.empty(0, dtype=np.float32)
 
     def add_vector(self, key: str, vector: np.ndarray) -> None:
-        self.vectors[key] = vector
-
-    def search(self, query_vector: np.ndarray, k: int) -> List[Tuple[str, float]]:
-        if not self.vectors:
+        row = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.sqrt(np.vdot(row, row))
+        if norm > 0:
+            row = row / norm
+        
+        scale = 1.0
+        if self.quantize:
+            row, scale = _quantize_int8(row)
+        
+        index = self._key_index.get(key)
+        if index is None:
+            index = len(self._keys)
+            self._reserve(index + 1, row.shape[0])
+            self._key_index[key] = index
+            self._keys.append(key)
+        self._matrix[index] = row
+        self._norms[index] = norm
+        self._scales[index] = scale
+
+    def _reserve(self, size: int, dim: int):
+        """确保矩阵至少能容纳 size 行"""
+        if self._matrix is None:
+            dtype = np.int8 if self.quantize else np.float32
+            self._matrix = np.empty((64, dim), dtype=dtype)
+            self._norms = np.empty(64, dtype=np.float32)
+            self._scales = np.empty(64, dtype=np.float32)
+        elif size > self._matrix.shape[0]:
+            count = len(self._keys)
+            capacity = max(size, self._matrix.shape[0] * 2)
+            grown = np.empty((capacity, dim), dtype=self._matrix.dtype)
+            grown[:count] = self._matrix[:count]
+            self._matrix = grown
+            self._norms = np.resize(self._norms, capacity)
+            self._scales = np.resize(self._scales, capacity)
+
+    def search(self, query_vector: np.ndarray, k: int,
+               allowed: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """搜索最相似的向量，allowed 不为None时只在这些键中搜索"""
+        if not self._keys or k <= 0:
             return []
         
-        similarities = [
-            (key, float(cosine_similarity(query_vector.reshape(1, -1), 
-                                        vec.reshape(1, -1))[0][0]))
-            for key, vec in self.vectors.items()
-        ]
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:k]
+        count = len(self._keys)
+        if allowed is None:
+            rows = None
+            matrix = self._matrix[:count]
+            scales = self._scales[:count]
+        else:
+            rows = np.fromiter(
+                (self._key_index[key] for key in allowed if key in self._key_index),
+                dtype=np.intp
+            )
+            if len(rows) == 0:
+                return []
+            matrix = self._matrix[rows]
+            scales = self._scales[rows]
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        norm = np.sqrt(np.vdot(query, query))
+        if norm > 0:
+            query = query / norm
+        
+        # 一次调用计算全部相似度（SimSIMD按CPU指令集选择内核），部分排序取前k个
+        if self.quantize:
+            if simsimd is not None:
+                # 余弦相似度与缩放无关，查询同样量化后直接使用int8内核
+                query_i8, _ = _quantize_int8(query)
+                scores = 1.0 - np.asarray(simsimd.cdist(query_i8[None, :], matrix, metric="cosine"))[0]
+            else:
+                scores = (matrix.astype(np.float32) @ query) / scales
+        elif simsimd is not None:
+            scores = 1.0 - np.asarray(simsimd.cdist(query[None, :], matrix, metric="cosine"))[0]
+        else:
+            scores = matrix @ query
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        indices = top if rows is None else rows[top]
+        return [(self._keys[i], float(scores[j])) for i, j in zip(indices, top)]
 
     def get_vector(self, key: str) -> Optional[np.ndarray]:
-        return self.vectors.get(key)
+        index = self._key_index.get(key)
+        if index is None:
+            return None
+        # 由归一化向量乘回原始范数还原（量化存储时先反量化）
+        row = self._matrix[index].astype(np.float32)
+        return row * (self._norms[index] / self._scales[index])
+
+    def remove_vector(self, key: str) -> None:
+        """删除向量，末行移入空出的行，矩阵保持紧凑"""
+        index = self._key_index.pop(key, None)
+        if index is None:
+            return
+        last = len(self._keys) - 1
+        last_key = self._keys.pop()
+        if index != last:
+            self._matrix[index] = self._matrix[last]
+            self._norms[index] = self._norms[last]
+            self._scales[index] = self._scales[last]
+            self._keys[index] = last_key
+            self._key_index[last_key] = index
 
 class EmbeddingManager:
     """嵌入向量管理器"""
-    def __init__(self, model_name: str = "shibing624/text2vec-base-chinese"):
+    def __init__(self, model_name: str = "shibing624/text2vec-base-chinese", cache_size: int = 1024,
+                 backend: str = "torch", compile_model: bool = False, onnx_dir: str = "onnx"):
+        """初始化嵌入模型：backend 为 "torch"（可选 torch.compile）或 "onnx"（CPU上int8量化推理，导出结果缓存在 onnx_dir）"""
+        # torch和transformers导入耗时较长，只在真正需要计算嵌入向量时才导入
+        import torch
+        from transformers import AutoTokenizer, AutoModel
+        
+        self.model_name = model_name
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model.to(self.device)
+        self.backend = backend
+        if backend == "onnx":
+            self.device = torch.device("cpu")
+            self.model = self._load_onnx_model(model_name, Path(onnx_dir) / model_name.replace("/", "__"))
+        elif backend == "torch":
+            self.model = AutoModel.from_pretrained(model_name)
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            self.model.to(self.device)
+            self.model.eval()
+            # GPU上使用半精度推理，显存带宽减半；CPU上保持float32
+            if self.device.type == "cuda":
+                self.model = self.model.half()
+            if compile_model:
+                # 输入长度变化时会触发重新编译，适合长期运行的进程
+                self.model = torch.compile(self.model, mode="reduce-overhead")
+        else:
+            raise ValueError(f"Unsupported embedding backend: {backend}")
+        # 池化后的嵌入维度等于模型隐藏层维度
+        self.dim = self.model.config.hidden_size
+        # 区分不同推理后端产生的向量：int8量化和半精度推理的输出与float32模型不完全一致
+        if backend == "onnx":
+            self.backend_tag = "onnx-int8"
+        else:
+            self.backend_tag = "torch-fp16" if self.device.type == "cuda" else "torch"
+        # 按文本哈希缓存最近的嵌入向量，同一轮对话中重复的文本只做一次前向计算
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+
+    @staticmethod
+    def _load_onnx_model(model_name: str, export_dir: Path):
+        """导出并量化ONNX模型（只在第一次使用时执行），返回ONNX Runtime模型"""
+        # optimum为可选依赖，仅在使用ONNX后端时导入
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        
+        if not (export_dir / "model.onnx").exists():
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            model.save_pretrained(export_dir)
+        
+        if not (export_dir / "model_quantized.onnx").exists():
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            quantizer.quantize(
+                save_dir=export_dir,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            )
+        
+        return ORTModelForFeatureExtraction.from_pretrained(
+            export_dir, file_name="model_quantized.onnx", provider="CPUExecutionProvider"
+        )
 
     def get_embedding(self, text: str) -> np.ndarray:
         """生成文本嵌入向量"""
-        inputs = self.tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
+        key = hashlib.sha1(text.encode("utf-8")).digest()
+        embedding = self._cache_get(key)
+        if embedding is None:
+            embedding = self._compute_embeddings([text])[0]
+            self._cache_put(key, embedding)
+        return embedding
+
+    def get_embeddings(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """批量生成文本嵌入向量，未命中缓存的文本按批次送入模型"""
+        keys = [hashlib.sha1(text.encode("utf-8")).digest() for text in texts]
+        embeddings = [self._cache_get(key) for key in keys]
+        
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            computed = self._compute_embeddings([texts[i] for i in batch])
+            for i, embedding in zip(batch, computed):
+                embeddings[i] = embedding
+                self._cache_put(keys[i], embedding)
+        
+        if not embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(embeddings)
+
+    def _cache_get(self, key: bytes) -> Optional[np.ndarray]:
+        embedding = self._cache.get(key)
+        if embedding is not None:
+            self._cache.move_to_end(key)
+        return embedding
+
+    def _cache_put(self, key: bytes, embedding: np.ndarray):
+        # 缓存的数组被多处共享，设为只读防止被意外修改
+        embedding.setflags(write=False)
+        self._cache[key] = embedding
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _compute_embeddings(self, texts: List[str]) -> np.ndarray:
+        """运行模型计算一批文本的嵌入向量"""
+        import torch
+        
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=512)
         inputs = {k: v.to(self.device) for k, v in inputs.items()}
         
-        with torch.no_grad():
+        with torch.inference_mode():
             outputs = self.model(**inputs)
-            embeddings = outputs.last_hidden_state.mean(dim=1)
+            # 按注意力掩码求平均，避免填充位置混入批内较短文本的向量；
+            # 池化在float32下进行，半精度模型的输出也统一返回float32
+            hidden = outputs.last_hidden_state.float()
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            summed = (hidden * mask).sum(dim=1)
+            embeddings = summed / mask.sum(dim=1).clamp(min=1e-9)
+        
+        return embeddings.cpu().numpy()
+
+class EmbeddingFileCache:
+    """嵌入向量磁盘缓存：float16内存映射矩阵 + JSON索引，文件内容未变化时直接复用"""
+    def __init__(self, cache_dir: str, model_name: str, dim: int, backend_tag: str):
+        directory = Path(cache_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.data_path = directory / "kb.f16"
+        self.index_path = directory / "kb.json"
+        # 索引：源文件路径 -> {"hash": 内容哈希, "row": 矩阵行号}
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.model_name = model_name
+        self.dim = dim
+        self.backend_tag = backend_tag
+        self.rows = 0
+        self._matrix: Optional[np.memmap] = None
         
-        return embeddings.cpu().numpy()[0]
+        if self.index_path.exists() and self.data_path.exists():
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            # 缓存由其他模型或推理后端生成时向量不可复用，整体作废，之后的写入覆盖旧文件
+            if (index.get("model") == model_name and index["dim"] == dim
+                    and index.get("backend") == backend_tag):
+                self.entries = index["files"]
+                self.rows = index["rows"]
+                # 只建立映射，不读取数据，启动开销与缓存大小无关
+                capacity = self.data_path.stat().st_size // (dim * 2)
+                self._matrix = np.memmap(self.data_path, dtype=np.float16, mode='r+',
+                                         shape=(capacity, dim))
+
+    def get(self, source_file: str, content_hash: str) -> Optional[np.ndarray]:
+        """返回缓存的嵌入向量，文件不在缓存中、内容已变化或维度与模型不符时返回None"""
+        entry = self.entries.get(source_file)
+        if entry is None or entry["hash"] != content_hash or self._matrix.shape[1] != self.dim:
+            return None
+        return np.asarray(self._matrix[entry["row"]], dtype=np.float32)
+
+    def put(self, source_file: str, content_hash: str, embedding: np.ndarray):
+        """写入嵌入向量，已缓存的文件复用原来的行"""
+        if embedding.shape[-1] != self.dim:
+            raise ValueError(f"Embedding dimension {embedding.shape[-1]} does not match cache dimension {self.dim}")
+        
+        entry = self.entries.get(source_file)
+        if entry is None:
+            self._reserve(self.rows + 1)
+            entry = self.entries[source_file] = {"row": self.rows}
+            self.rows += 1
+        entry["hash"] = content_hash
+        self._matrix[entry["row"]] = embedding
+
+    def _reserve(self, rows: int):
+        """确保映射文件至少能容纳 rows 行，不足时按倍数扩展文件后重新映射"""
+        if self._matrix is not None and rows <= self._matrix.shape[0]:
+            return
+        capacity = max(rows, 64, 2 * (self._matrix.shape[0] if self._matrix is not None else 0))
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self.data_path, 'ab') as f:
+            f.truncate(capacity * self.dim * 2)
+        self._matrix = np.memmap(self.data_path, dtype=np.float16, mode='r+', shape=(capacity, self.dim))
+
+    def flush(self):
+        """把映射矩阵和索引写回磁盘"""
+        if self._matrix is not None:
+            self._matrix.flush()
+        tmp_path = self.index_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "model": self.model_name,
+                "backend": self.backend_tag,
+                "dim": self.dim,
+                "rows": self.rows,
+                "files": self.entries
+            }, f)
+        os.replace(tmp_path, self.index_path)
 
 # ============= 内容处理器 =============
 
+# 内容处理器使用的预编译正则表达式
+_MD_TITLE_RE = re.compile(r'^#\s+(.+)$', re.MULTILINE)
+_MD_TAGS_RE = re.compile(r'(?:tags:|#)([a-zA-Z0-9_\-]+)')
+_PY_DOC_RE = re.compile(r'"""(.+?)"""', re.DOTALL)
+_PY_DEF_RE = re.compile(r'(?:def|class)\s+([a-zA-Z0-9_]+)')
+
 class MarkdownProcessor(ContentProcessor):
     """Markdown文件处理器"""
     def extract_content(self, content: str) -> Tuple[str, str, List[str]]:
-        title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+        title_match = _MD_TITLE_RE.search(content)
         title = title_match.group(1) if title_match else "Untitled"
-        tags = re.findall(r'(?:tags:|#)([a-zA-Z0-9_\-]+)', content)
+        tags = _MD_TAGS_RE.findall(content)
         return title, content, tags
 
     def supported_extensions(self) -> List[str]:
@@ -129,14 +454,14 @@ class MarkdownProcessor(ContentProcessor):
 class PythonProcessor(ContentProcessor):
     """Python文件处理器"""
     def extract_content(self, content: str) -> Tuple[str, str, List[str]]:
-        docstring_match = re.search(r'"""(.+?)"""', content, re.DOTALL)
+        docstring_match = _PY_DOC_RE.search(content)
         title = ""
         if docstring_match:
             docstring = docstring_match.group(1).strip()
             first_line = docstring.split('\n')[0]
             title = first_line
         
-        tags = re.findall(r'(?:def|class)\s+([a-zA-Z0-9_]+)', content)
+        tags = _PY_DEF_RE.findall(content)
         return title or "Python Module", content, tags
 
     def supported_extensions(self) -> List[str]:
@@ -146,12 +471,20 @@ class PythonProcessor(ContentProcessor):
 
 class KnowledgeBase:
     """知识库管理器"""
-    def __init__(self, embedding_manager: EmbeddingManager, vector_store: Optional[VectorStore] = None):
+    def __init__(self, embedding_manager: EmbeddingManager, vector_store: Optional[VectorStore] = None,
+                 cache_dir: Optional[str] = None):
         self.embedding_manager = embedding_manager
         self.vector_store = vector_store or SimpleVectorStore()
+        # 指定 cache_dir 时嵌入向量持久化到磁盘，重启后内容未变化的文件不再重新计算
+        # 缓存按模型名称、维度和推理后端区分，换模型或后端后旧向量不会被误用
+        self.embedding_cache = EmbeddingFileCache(
+            cache_dir, embedding_manager.model_name, embedding_manager.dim, embedding_manager.backend_tag
+        ) if cache_dir else None
         self.knowledge_items: Dict[str, KnowledgeItem] = {}
-        self.categories: Dict[str, List[str]] = {}
-        self.tags: Dict[str, List[str]] = {}
+        self.categories: Dict[str, Set[str]] = {}
+        self.tags: Dict[str, Set[str]] = {}
+        # 源文件 -> 条目ID，文件内容变化后用于移除旧版本的条目
+        self._file_ids: Dict[str, str] = {}
         self.processors: Dict[str, ContentProcessor] = {
             '.md': MarkdownProcessor(),
             '.py': PythonProcessor(),
@@ -162,29 +495,76 @@ class KnowledgeBase:
         for ext in processor.supported_extensions():
             self.processors[ext] = processor
 
-    def scan_directory(self, directory_path: str, recursive: bool = True):
-        """扫描目录并导入知识"""
+    def scan_directory(self, directory_path: str, recursive: bool = True, batch_size: int = 32,
+                       max_workers: Optional[int] = None):
+        """扫描目录并导入知识：多线程读取全部文件，再在当前线程批量生成嵌入向量"""
         base_path = Path(directory_path)
         pattern = "**/*" if recursive else "*"
+        file_paths = [
+            file_path for file_path in base_path.glob(pattern)
+            if file_path.suffix in self.processors and file_path.is_file()
+        ]
+        
+        # 读取和解析只产生新的条目，不修改共享状态，线程之间无需加锁
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            items = [item for item in executor.map(self._try_read_file, file_paths) if item]
         
-        for file_path in base_path.glob(pattern):
-            if file_path.is_file() and file_path.suffix in self.processors:
-                try:
-                    self.import_file(file_path)
-                except Exception as e:
-                    print(f"Error importing {file_path}: {str(e)}")
+        self._embed_items(items, batch_size)
+        for item in items:
+            self.add_item(item)
 
     def import_file(self, file_path: Path):
         """导入单个文件"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        item = self._read_file(file_path)
+        if item:
+            self._embed_items([item])
+            self.add_item(item)
+
+    def _embed_items(self, items: List[KnowledgeItem], batch_size: int = 32):
+        """为缺少嵌入向量的条目批量计算嵌入，优先使用磁盘缓存"""
+        pending = [item for item in items if item.embedding is None]
+        if self.embedding_cache is not None:
+            # 条目ID由路径和文件内容哈希得到，可直接用于判断文件是否变化
+            for item in pending:
+                item.embedding = self.embedding_cache.get(item.source_file, item.id)
+            pending = [item for item in pending if item.embedding is None]
+        if not pending:
+            return
         
+        embeddings = self.embedding_manager.get_embeddings(
+            [f"{item.title}\n{item.content}" for item in pending],
+            batch_size=batch_size
+        )
+        for item, embedding in zip(pending, embeddings):
+            item.embedding = embedding
+        
+        if self.embedding_cache is not None:
+            for item in pending:
+                self.embedding_cache.put(item.source_file, item.id, item.embedding)
+            self.embedding_cache.flush()
+
+    def _try_read_file(self, file_path: Path) -> Optional[KnowledgeItem]:
+        """读取文件，出错时打印错误并跳过"""
+        try:
+            return self._read_file(file_path)
+        except Exception as e:
+            print(f"Error importing {file_path}: {str(e)}")
+            return None
+
+    def _read_file(self, file_path: Path) -> Optional[KnowledgeItem]:
+        """读取文件并解析为知识条目（不计算嵌入向量）"""
         processor = self.processors.get(file_path.suffix)
         if not processor:
-            return
+            return None
         
-        title, content, tags = processor.extract_content(content)
-        file_id = hashlib.md5(f"{file_path}:{hash(content)}".encode()).hexdigest()[:12]
+        # 直接对文件字节求哈希，之后再解码；路径参与哈希以区分内容相同的不同文件
+        raw = file_path.read_bytes()
+        digest = hashlib.blake2b(str(file_path).encode('utf-8'), digest_size=6)
+        digest.update(b'\0')
+        digest.update(raw)
+        file_id = digest.hexdigest()
+        
+        title, content, tags = processor.extract_content(raw.decode('utf-8'))
         category = file_path.parent.name or "general"
         
         item = KnowledgeItem(
@@ -197,54 +577,63 @@ class KnowledgeBase:
             metadata={
                 "file_type": file_path.suffix,
                 "imported_at": datetime.now().isoformat(),
-                "file_size": os.path.getsize(file_path)
+                "file_size": len(raw)
             }
         )
-        
-        self.add_item(item)
+        return item
 
     def add_item(self, item: KnowledgeItem):
         """添加知识条目"""
         if item.embedding is None:
             item.embedding = self.embedding_manager.get_embedding(f"{item.title}\n{item.content}")
         
+        if item.source_file:
+            # 文件内容变化后ID随之变化，先移除该文件旧版本的条目
+            previous = self._file_ids.get(item.source_file)
+            if previous is not None and previous != item.id and previous in self.knowledge_items:
+                self._remove_item(previous)
+            self._file_ids[item.source_file] = item.id
+        
         self.knowledge_items[item.id] = item
         self.vector_store.add_vector(item.id, item.embedding)
         
-        if item.category not in self.categories:
-            self.categories[item.category] = []
-        self.categories[item.category].append(item.id)
-        
+        self.categories.setdefault(item.category, set()).add(item.id)
         for tag in item.tags:
-            if tag not in self.tags:
-                self.tags[tag] = []
-            self.tags[tag].append(item.id)
+            self.tags.setdefault(tag, set()).add(item.id)
+
+    def _remove_item(self, item_id: str):
+        """从条目、向量存储以及分类和标签索引中移除知识条目"""
+        item = self.knowledge_items.pop(item_id)
+        self.vector_store.remove_vector(item_id)
+        for index, key in [(self.categories, item.category)] + [(self.tags, tag) for tag in item.tags]:
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del index[key]
 
     def query(self, query_text: str, k: int = 3, category: Optional[str] = None, 
-             tags: Optional[List[str]] = None) -> List[Tuple[KnowledgeItem, float]]:
-        """查询知识库"""
-        query_embedding = self.embedding_manager.get_embedding(query_text)
-        results = self.vector_store.search(query_embedding, k)
+             tags: Optional[List[str]] = None,
+             embedding: Optional[np.ndarray] = None) -> List[Tuple[KnowledgeItem, float]]:
+        """查询知识库，已有查询向量时通过 embedding 传入以免重复计算"""
+        # 先用分类和标签索引求出候选集合，向量搜索只在候选中进行
+        allowed: Optional[Set[str]] = None
+        if category:
+            allowed = self.categories.get(category, set())
+        if tags:
+            tagged = set().union(*(self.tags.get(tag, ()) for tag in tags))
+            allowed = tagged if allowed is None else allowed & tagged
+        if allowed is not None and not allowed:
+            return []
         
-        items_with_scores = [
+        query_embedding = embedding if embedding is not None else self.embedding_manager.get_embedding(query_text)
+        results = self.vector_store.search(query_embedding, k, allowed)
+        
+        return [
             (self.knowledge_items[item_id], score)
             for item_id, score in results
             if item_id in self.knowledge_items
         ]
-        
-        if category:
-            items_with_scores = [
-                (item, score) for item, score in items_with_scores
-                if item.category == category
-            ]
-        
-        if tags:
-            items_with_scores = [
-                (item, score) for item, score in items_with_scores
-                if any(tag in item.tags for tag in tags)
-            ]
-        
-        return items_with_scores
 
     def get_statistics(self) -> Dict[str, Any]:
         """获取知识库统计信息"""
@@ -266,10 +655,30 @@ class KnowledgeBase:
 
 class AIPairProgrammingAgent:
     """AI配对编程助手"""
-    def __init__(self, model_name: str = "shibing624/text2vec-base-chinese"):
-        self.embedding_manager = EmbeddingManager(model_name)
-        self.knowledge_base = KnowledgeBase(self.embedding_manager)
-        self.memories: List[Memory] = []
+    def __init__(self, model_name: str = "shibing624/text2vec-base-chinese",
+                 quantize_embeddings: bool = False, cache_dir: Optional[str] = None,
+                 embedding_backend: str = "torch", compile_model: bool = False):
+        self.embedding_manager = EmbeddingManager(model_name, backend=embedding_backend,
+                                                  compile_model=compile_model)
+        if simsimd is None and numba is not None:
+            # 只有未安装SimSIMD时才会用到Numba内核；初始化时预先编译float32版本，
+            # 避免第一次检索承担JIT开销，只导入模块时不编译
+            _cos_scores(np.zeros((1, 1), dtype=np.float32), np.zeros(1, dtype=np.float32), 0.0)
+        # 量化后知识库和记忆中的向量都以int8保存，内存约为float32的1/4
+        self.quantize_embeddings = quantize_embeddings
+        self.knowledge_base = KnowledgeBase(
+            self.embedding_manager,
+            SimpleVectorStore(quantize=quantize_embeddings),
+            cache_dir=cache_dir
+        )
+        # 记忆按列存储：嵌入向量按行存入预分配矩阵，检索时一次性计算全部相似度，
+        # 其余字段保存在平行的列表中，需要时再构建Memory视图
+        self._mem_matrix: Optional[np.ndarray] = None
+        self._mem_count = 0
+        self._mem_contents: List[str] = []
+        self._mem_timestamps = array('d')
+        self._mem_types: List[str] = []
+        self._mem_metadatas: List[Optional[Dict[str, Any]]] = []
         self.conversation_history = []
         self.memory_threshold = 0.7
         self.workspace_path = None
@@ -289,45 +698,79 @@ class AIPairProgrammingAgent:
         self.knowledge_base.scan_directory(directory_path, recursive)
         return self.get_knowledge_base_stats()
 
-    def add_memory(self, content: str, memory_type: str, metadata: Optional[Dict[str, Any]] = None):
+    def add_memory(self, content: str, memory_type: str, metadata: Optional[Dict[str, Any]] = None,
+                   embedding: Optional[np.ndarray] = None):
         """添加记忆"""
-        embedding = self.embedding_manager.get_embedding(content)
-        memory = Memory(
-            content=content,
-            embedding=embedding,
-            timestamp=time.time(),
-            type=memory_type,
-            metadata=metadata
+        if embedding is None:
+            embedding = self.embedding_manager.get_embedding(content)
+        if self.quantize_embeddings:
+            embedding, _ = _quantize_int8(embedding)
+        self._append_memory_row(embedding)
+        self._mem_contents.append(content)
+        self._mem_timestamps.append(time.time())
+        self._mem_types.append(memory_type)
+        self._mem_metadatas.append(metadata)
+
+    @property
+    def memories(self) -> List[Memory]:
+        """全部记忆（按需构建的Memory视图）"""
+        return [self._memory(i) for i in range(self._mem_count)]
+
+    def _memory(self, index: int) -> Memory:
+        """由各列数据构建第 index 条记忆的Memory视图"""
+        return Memory(
+            content=self._mem_contents[index],
+            embedding=self._mem_matrix[index],
+            timestamp=self._mem_timestamps[index],
+            type=self._mem_types[index],
+            metadata=self._mem_metadatas[index]
         )
-        self.memories.append(memory)
 
-    def retrieve_relevant_memories(self, query: str, k: int = 3) -> List[Tuple[Memory, float]]:
-        """检索相关记忆"""
-        if not self.memories:
+    def _append_memory_row(self, embedding: np.ndarray):
+        """把嵌入向量写入记忆矩阵，容量不足时按倍数扩容"""
+        if self._mem_matrix is None:
+            dtype = np.int8 if self.quantize_embeddings else np.float32
+            self._mem_matrix = np.empty((64, embedding.shape[-1]), dtype=dtype)
+        elif self._mem_count == self._mem_matrix.shape[0]:
+            grown = np.empty((self._mem_count * 2, self._mem_matrix.shape[1]), dtype=self._mem_matrix.dtype)
+            grown[:self._mem_count] = self._mem_matrix
+            self._mem_matrix = grown
+        
+        self._mem_matrix[self._mem_count] = embedding
+        self._mem_count += 1
+
+    def retrieve_relevant_memories(self, query: str, k: int = 3,
+                                   embedding: Optional[np.ndarray] = None) -> List[Tuple[Memory, float]]:
+        """检索相关记忆，已有查询向量时通过 embedding 传入以免重复计算"""
+        if not self._mem_count or k <= 0:
             return []
 
-        query_embedding = self.embedding_manager.get_embedding(query)
-        similarities = [
-            (memory, float(cosine_similarity(query_embedding.reshape(1, -1), 
-                                          memory.embedding.reshape(1, -1))[0][0]))
-            for memory in self.memories
-        ]
+        query_embedding = embedding if embedding is not None else self.embedding_manager.get_embedding(query)
+        if self.quantize_embeddings:
+            query_embedding, _ = _quantize_int8(query_embedding)
+        else:
+            query_embedding = query_embedding.astype(np.float32, copy=False)
         
-        relevant_memories = [
-            (memory, sim) for memory, sim in similarities
-            if sim >= self.memory_threshold
-        ]
-        relevant_memories.sort(key=lambda x: x[1], reverse=True)
-        return relevant_memories[:k]
+        # 先按阈值过滤，排序只在通过阈值的候选上进行
+        scores = _cosine_scores(self._mem_matrix[:self._mem_count], query_embedding)
+        top = np.flatnonzero(scores >= self.memory_threshold)
+        
+        # 只对候选部分排序取前k个
+        if len(top) > k:
+            top = top[np.argpartition(-scores[top], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self._memory(i), float(scores[i])) for i in top]
 
     def generate_response(self, user_input: str, context: Optional[Dict] = None) -> str:
         """生成响应"""
         self.conversation_history.append({"role": "user", "content": user_input})
-        self.add_memory(user_input, "conversation", context)
+        # 用户输入只计算一次嵌入，写入记忆和两次检索共用
+        query_embedding = self.embedding_manager.get_embedding(user_input)
+        self.add_memory(user_input, "conversation", context, embedding=query_embedding)
         
         # 获取相关记忆和知识
-        relevant_memories = self.retrieve_relevant_memories(user_input)
-        relevant_knowledge = self.knowledge_base.query(user_input)
+        relevant_memories = self.retrieve_relevant_memories(user_input, embedding=query_embedding)
+        relevant_knowledge = self.knowledge_base.query(user_input, embedding=query_embedding)
         
         # 构建增强上下文
         enhanced_context = context or {}
@@ -365,26 +808,22 @@ class AIPairProgrammingAgent:
     def _generate_response_with_context(self, user_input: str, context: Dict) -> str:
         """根据上下文生成响应"""
         # 这里可以集成不同的响应生成策略
-        relevant_memories = context.get("relevant_memories", [])
-        relevant_knowledge = context.get("relevant_knowledge", [])
-        
-        memory_context = "\n".join([
-            f"相关记忆 ({mem['type']}): {mem['content']}"
-            for mem in relevant_memories
-        ])
+        relevant_memories = context.get("relevant_memories", ())
+        relevant_knowledge = context.get("relevant_knowledge", ())
         
-        knowledge_context = "\n".join([
-            f"相关知识 ({item['category']}): {item['title']}\n{item['content'][:200]}..."
-            for item in relevant_knowledge
-        ])
-        
-        response_parts = ["我理解你的请求。让我们结合已有的经验和知识来处理。"]
-        if memory_context:
-            response_parts.append(f"\n基于历史记忆：\n{memory_context}")
-        if knowledge_context:
-            response_parts.append(f"\n参考知识：\n{knowledge_context}")
+        # 直接写入缓冲区，不再构建中间列表再拼接
+        buf = io.StringIO()
+        buf.write("我理解你的请求。让我们结合已有的经验和知识来处理。")
+        if relevant_memories:
+            buf.write("\n\n基于历史记忆：")
+            for mem in relevant_memories:
+                buf.write(f"\n相关记忆 ({mem['type']}): {mem['content']}")
+        if relevant_knowledge:
+            buf.write("\n\n参考知识：")
+            for item in relevant_knowledge:
+                buf.write(f"\n相关知识 ({item['category']}): {item['title']}\n{item['content'][:200]}...")
         
-        return "\n".join(response_parts)
+        return buf.getvalue()
 
     def get_knowledge_base_stats(self) -> str:
         """获取知识库统计信息"""
@@ -397,9 +836,13 @@ class AIPairProgrammingAgent:
         )
 
 def create_agent(workspace_path: Optional[str] = None, 
-                model_name: str = "shibing624/text2vec-base-chinese") -> AIPairProgrammingAgent:
-    """创建AI配对编程助手实例"""
-    agent = AIPairProgrammingAgent(model_name)
+                model_name: str = "shibing624/text2vec-base-chinese",
+                cache_dir: Optional[str] = None,
+                embedding_backend: str = "torch",
+                compile_model: bool = False) -> AIPairProgrammingAgent:
+    """创建AI配对编程助手实例，cache_dir 用于持久化知识库的嵌入向量，embedding_backend/compile_model 选择推理方式"""
+    agent = AIPairProgrammingAgent(model_name, cache_dir=cache_dir,
+                                   embedding_backend=embedding_backend, compile_model=compile_model)
     if workspace_path:
         agent.set_workspace(workspace_path)
         agent.scan_workspace()